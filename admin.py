@@ -12,10 +12,16 @@ except ImportError:
     config = None
 
 # Import modules
-from admin_modules.overpass import fetch_streets_multi_plz, get_overpass_data, process_streets
+from admin_modules.overpass import fetch_streets_multi_plz, get_overpass_data, house_points, prepare_assignment, process_streets, radius_histogram, refresh_cache
 from admin_modules.vm import start_vm, schedule_stop_vm, get_vm_details
 from admin_modules.backups import restore_backup, cleanup_backups
 from admin_modules.users import anonymize_users
+from admin_modules.polyline import encode_plan, decode_plan
+from admin_modules.raw_cache import RawCache
+from admin_modules.house_index import house_index_path, write_house_index
+from admin_modules.graph import add_neighbors
+from admin_modules.districts import assign_districts
+from app_modules.payloads import publish_geometry
 
 def check_active_survey():
     """Checks if a survey is currently running and warns the user."""
@@ -79,18 +85,20 @@ def generate_multi_plan():
 
     # 3. Interactive Processing Loop
     radius = 45 # Default
-    streets_dict = None
-    coords_list = None
+    sweep_max = 100
+    # Nearest street of every house is computed once, changing the radius only re-thresholds
+    print(f"\n⚙️  Berechne Abstände Haus -> Straße (bis {sweep_max}m)...")
+    prepared = prepare_assignment(data_s, data_h, sweep_max)
     
     while True:
-        print(f"\n⚙️  Berechne Zuordnung (Radius: {radius}m)...")
-        streets_dict, coords_list, stats = process_streets(data_s, data_h, radius)
-        
-        print(f"\n📊 Statistik:")
-        print(f"   🏠 Häuser gefunden (Overpass): {stats['total_houses']}")
-        print(f"   ✅ Zugeordnet zu Straßen:      {stats['assigned_houses']}")
-        print(f"   ❌ Nicht zugeordnet:           {stats['unassigned']} ({(stats['unassigned']/max(1,stats['total_houses'])*100):.1f}%)")
-        print(f"   📏 Aktueller Radius:           {stats['radius']} Meter")
+        total = prepared['total_houses']
+        print(f"\n📊 Statistik (Häuser gefunden: {total}):")
+        radii = sorted(set(range(max(5, radius - 20), radius + 31, 5)) | {radius})
+        for r, assigned, unassigned in radius_histogram(prepared, [r for r in radii if r <= prepared['max_radius']]):
+            share = assigned / max(1, total)
+            marker = "👉" if r == radius else "  "
+            print(f"   {marker} {r:>4}m  {'█' * int(share * 20):<20}  ✅ {assigned:>6}  ❌ {unassigned:>6} ({(1 - share) * 100:.1f}%)")
+        print(f"   📏 Aktueller Radius: {radius} Meter")
         
         print("\nOptionen:")
         print("1. ✅ Weiter (Ergebnis verwenden)")
@@ -110,9 +118,22 @@ def generate_multi_plan():
             except: print("Ungültige Eingabe.")
         else:
             print("Unbekannte Option.")
+
+        if radius > prepared['max_radius']:
+            sweep_max = radius + 50
+            print(f"\n⚙️  Berechne Abstände Haus -> Straße (bis {sweep_max}m)...")
+            prepared = prepare_assignment(data_s, data_h, sweep_max)
+    
+    print(f"\n⚙️  Berechne Zuordnung (Radius: {radius}m)...")
+    streets_dict, coords_list, stats = process_streets(data_s, data_h, radius, prepared=prepared)
+    print(f"   ✅ Zugeordnet: {stats.get('assigned_houses', 0)} / {stats.get('total_houses', 0)} Häuser, {len(streets_dict)} Straßen")
+    print(f"      🏷️  {stats.get('by_addr_street', 0)} über addr:street, 📐 {stats.get('by_distance', 0)} über den Abstand")
     
     if not streets_dict: return
 
+    # All address points (incl. unassigned) for counting houses of manually drawn streets on the server
+    all_houses = [(lat, lon) for lat, lon, *_ in house_points(data_h)[0]]
+
     # --- Merge Logic: Existing Data ---
     should_ask_import = False
     if os.path.exists('data/streets_status.json'):
@@ -140,7 +161,7 @@ def generate_multi_plan():
         if import_mode in ['1', '2', '3']:
             try:
                 with open('data/streets_status.json', 'r', encoding='utf-8') as f:
-                    old_data = json.load(f)
+                    old_data = decode_plan(json.load(f))
                 
                 merged, manual = 0, 0
                 old_streets = old_data.get('streets', {})
@@ -162,6 +183,17 @@ def generate_multi_plan():
             except Exception as e:
                 print(f"⚠️ Merge-Fehler: {e}")
 
+    # Street adjacency for "Angrenzend" on the page (incl. imported manual streets)
+    edges = add_neighbors(streets_dict)
+    print(f"🔗 Nachbarschaften: {edges} Verbindungen zwischen {len(streets_dict)} Straßen")
+
+    # Optional: teams book whole districts of similar size
+    district_count = getattr(config, 'DISTRICTS', 0) if config else 0
+    if district_count:
+        d_stats = assign_districts(streets_dict, district_count)
+        loads = d_stats['households']
+        print(f"🗂️  Bezirke: {d_stats['districts']} mit je {min(loads)}-{max(loads)} Haushalten (Ziel {d_stats['target']})")
+
     avg_lat = sum(c[0] for c in coords_list) / len(coords_list) if coords_list else 0
     avg_lon = sum(c[1] for c in coords_list) / len(coords_list) if coords_list else 0
     
@@ -186,6 +218,10 @@ def generate_multi_plan():
         "streets": streets_dict
     }
     
+    # Optional compact geometry (1e-6 fixed-point, delta-encoded polylines)
+    if config and getattr(config, 'GEOMETRY_FORMAT', None) == 'polyline6':
+        export_data = encode_plan(export_data)
+    
     os.makedirs('data', exist_ok=True)
     
     # --- Staging Selection ---
@@ -208,14 +244,26 @@ def generate_multi_plan():
         print("💾 Speichere als LIVE Version...")
         with open(target_file, 'w', encoding='utf-8') as f:
             json.dump(export_data, f, indent=2, sort_keys=True, ensure_ascii=False)
+        write_house_index(house_index_path(target_file), all_houses)
         print(f"\n✅ Erfolgreich! Straßen: {len(streets_dict)}")
         
+        # Precompressed geometry (.gz/.br), served by the web app without per-request compression
+        artifacts = []
+        try:
+            artifacts = publish_geometry(target_file)
+            print(f"📦 Geometrie-Artefakte: {', '.join(os.path.basename(p) for p in artifacts)}")
+        except Exception as e:
+            print(f"⚠️ Fehler beim Erzeugen der Geometrie-Artefakte: {e}")
+        
         # Standard Push Logic for Live
         if config and input("\n🚀 Änderungen jetzt zu GitHub pushen? (j/n): ").strip().lower() == 'j':
              # Git Push Logic
             try:
                 print("⏳ Führe Git-Operationen durch...")
-                subprocess.run(["git", "add", target_file], check=True)
+                subprocess.run(["git", "add", target_file, house_index_path(target_file)], check=True)
+                if artifacts:
+                    # -A also stages artifacts of older plans that were pruned
+                    subprocess.run(["git", "add", "-A", os.path.dirname(artifacts[0])], check=True)
                 
                 if subprocess.run(["git", "diff", "--cached", "--quiet"]).returncode == 1:
                     msg = getattr(config, 'GIT_COMMIT_MESSAGE', f"Update Plan: {label}")
@@ -241,6 +289,7 @@ def generate_multi_plan():
         # Save Content
         with open(staging_file, 'w', encoding='utf-8') as f:
             json.dump(export_data, f, indent=2, sort_keys=True, ensure_ascii=False)
+        write_house_index(house_index_path(staging_file), all_houses)
             
         # Save Meta Access
         access_data = {"uuid": staging_id, "created": datetime.now().isoformat()}
@@ -255,7 +304,7 @@ def generate_multi_plan():
                 try:
                     print("⏳ Pushe Staging-Dateien (inkl. Assets)...")
                     # Force add static in case they were ignored or new
-                    subprocess.run(["git", "add", staging_file, access_file, "static/"], check=True)
+                    subprocess.run(["git", "add", staging_file, house_index_path(staging_file), access_file, "static/"], check=True)
                     subprocess.run(["git", "commit", "-m", f"Staging Build: {label}"], check=True)
                     
                     remote = getattr(config, 'GIT_REMOTE_URL', 'origin')
@@ -391,6 +440,10 @@ def print_help():
     print("\n5. 🏥 Server Status Check:")
     print("   - Prüft, ob die Web-App erreichbar ist.")
     print("   - Misst Antwortzeit.")
+    print("\n9. 📦 Cache-Status:")
+    print("   - Zeigt die zwischengespeicherten Overpass-Rohdaten in 'cache/'.")
+    print("   - Einträge verfallen nach CACHE_TTL_DAYS, über CACHE_MAX_MB wird der älteste verdrängt.")
+    print("   - Aktualisieren lädt nur, was sich in OSM seit dem letzten Abruf geändert hat.")
     input("\n(Drücke Enter um zurückzukehren)")
 
 def stop_survey():
@@ -471,6 +524,23 @@ def ssh_to_vm():
     except Exception as e:
         print(f"❌ Fehler: {e}")
 
+def cache_status():
+    cache = RawCache()
+    entries = cache.entries()
+    print("\n--- 📦 RAW-CACHE ---")
+    if not entries:
+        print("Cache ist leer.")
+    now = time.time()
+    for path, size, mtime in reversed(entries):
+        print(f"  {os.path.basename(path):<40} {size / 1024:8.0f} KB   zuletzt genutzt vor {(now - mtime) / 86400:.1f} Tagen")
+    total = sum(size for _, size, _ in entries)
+    limit = f" von {cache.max_bytes / 1024 / 1024:.0f} MB" if cache.max_bytes else ""
+    ttl = f", Ablauf nach {cache.ttl / 86400:.0f} Tagen" if cache.ttl else ""
+    print(f"Gesamt: {len(entries)} Einträge, {total / 1024 / 1024:.1f} MB{limit}{ttl}")
+    if entries and input("\n🔄 Nur Änderungen seit dem letzten Abruf von OSM laden (Cache aktualisieren)? (j/n): ").strip().lower() == 'j':
+        refresh_cache(cache=cache)
+    input("\n(Drücke Enter um zurückzukehren)")
+
 def main_menu():
     while True:
         print("\n--- 🛠️ ADMIN TOOL ---")
@@ -482,9 +552,10 @@ def main_menu():
         print("6. ❓ Hilfe anzeigen")
         print("7. 🛑 Aktion beenden (Offline-Modus)")
         print("8. 📟 SSH Login")
+        print("9. 📦 Cache-Status")
         print("0. ❌ Beenden")
         
-        choice = input("\nWähle eine Option (0-8): ").strip()
+        choice = input("\nWähle eine Option (0-9): ").strip()
         
         if choice == '1':
             generate_multi_plan()
@@ -502,6 +573,8 @@ def main_menu():
             stop_survey()
         elif choice == '8':
             ssh_to_vm()
+        elif choice == '9':
+            cache_status()
         elif choice == '0':
             print("👋 Bye!")
             break
@@ -0,0 +1,133 @@
+"""House-to-street assignment: nearest street segment within a radius.
+
+Two engines with identical results: plain Python, and NumPy (optional)
+which handles all houses of a block of grid cells in one vectorized step. Both
+compute the same float64 expressions in the same order and break ties by
+the lower segment number, so they agree bit for bit.
+"""
+
+import math
+
+from .spatial import LocalProjection, SegmentIndex
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import config
+except ImportError:
+    config = None
+
+# Segments longer than a cell are registered in every cell of their bbox,
+# so tiny radii must not make the cells tiny as well
+MIN_CELL_M = 20.0
+
+# Upper bound for the (houses x segments) matrices of the NumPy engine
+CHUNK_ELEMENTS = 1_000_000
+
+# Houses are vectorized in blocks of this many grid cells per side
+GROUP_CELLS = 8
+
+
+def make_projection(street_paths):
+    """LocalProjection centred on the bbox of all streets ({id: [[lat, lon], ...] lines})."""
+    lats = [p[0] for paths in street_paths.values() for line in paths for p in line]
+    lons = [p[1] for paths in street_paths.values() for line in paths for p in line]
+    if not lats:
+        return LocalProjection(0.0)
+    return LocalProjection((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+
+
+def build_segment_index(street_paths, proj, radius_m=None):
+    """SegmentIndex over all segments of all streets, cell size derived from the radius."""
+    index = SegmentIndex(max(radius_m or 0, MIN_CELL_M))
+    for s_id, paths in street_paths.items():
+        index.add_lines(s_id, [[proj(p[0], p[1]) for p in line] for line in paths])
+    return index
+
+
+def default_engine():
+    """'numpy' if available (and not switched off via config ASSIGN_ENGINE), else 'python'."""
+    wanted = getattr(config, 'ASSIGN_ENGINE', 'auto') if config else 'auto'
+    if wanted == 'python' or np is None:
+        return 'python'
+    return 'numpy'
+
+
+def nearest_streets(street_paths, points, radius_m=None, engine=None):
+    """For every (lat, lon) in points: (street id, distance in m) of the closest segment
+    closer than radius_m (None: no limit), or (None, None)."""
+    if not points:
+        return []
+    proj = make_projection(street_paths)
+    index = build_segment_index(street_paths, proj, radius_m)
+    return nearest_in_index(index, [proj(lat, lon) for lat, lon in points], radius_m, engine)
+
+
+def nearest_in_index(index, xy, radius_m=None, engine=None):
+    """nearest_streets() for points already projected into the index's frame."""
+    if not len(index):
+        return [(None, None)] * len(xy)
+    if (engine or default_engine()) == 'numpy' and np is not None:
+        return _nearest_numpy(index, xy, radius_m)
+    return [index.nearest(x, y, radius_m) for x, y in xy]
+
+
+def _nearest_numpy(index, xy, radius_m):
+    seg = np.array(index.segments, dtype=np.float64)
+    ax, ay, bx, by = seg[:, 0], seg[:, 1], seg[:, 2], seg[:, 3]
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    pts = np.array(xy, dtype=np.float64)
+
+    best_idx = np.full(len(xy), -1, dtype=np.int64)
+    best_d2 = np.full(len(xy), np.inf)
+
+    if radius_m is None:
+        groups = [(np.arange(len(xy)), np.arange(len(seg)))]
+    else:
+        # Houses of one block of GROUP_CELLS x GROUP_CELLS grid cells share their candidates
+        cs = index.cell_size
+        reach = int(math.ceil(radius_m / cs))
+        by_block = {}
+        for i, (x, y) in enumerate(xy):
+            ci, cj = math.floor(x / cs), math.floor(y / cs)
+            by_block.setdefault((ci // GROUP_CELLS, cj // GROUP_CELLS), []).append(i)
+        groups = []
+        for (bi, bj), members in by_block.items():
+            cand = set()
+            for i in range(bi * GROUP_CELLS - reach, (bi + 1) * GROUP_CELLS + reach):
+                for j in range(bj * GROUP_CELLS - reach, (bj + 1) * GROUP_CELLS + reach):
+                    cand.update(index.cells.get((i, j), ()))
+            if cand:
+                groups.append((np.array(members), np.array(sorted(cand))))
+
+    r2 = np.inf if radius_m is None else radius_m * radius_m
+    for members, cand in groups:
+        step = max(1, CHUNK_ELEMENTS // len(cand))
+        for k in range(0, len(members), step):
+            rows = members[k:k + step]
+            px, py = pts[rows, 0][:, None], pts[rows, 1][:, None]
+            cax, cay, cdx, cdy, cseg2 = ax[cand], ay[cand], dx[cand], dy[cand], seg2[cand]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = ((px - cax) * cdx + (py - cay) * cdy) / cseg2
+            t = np.where(cseg2 == 0, 0.0, t)
+            t = np.where(t < 0.0, 0.0, np.where(t > 1.0, 1.0, t))
+            ex = px - (cax + t * cdx)
+            ey = py - (cay + t * cdy)
+            d2 = ex * ex + ey * ey
+            d2 = np.where(d2 < r2, d2, np.inf)
+
+            # argmin returns the first minimum, candidates are sorted: lowest segment wins ties
+            col = np.argmin(d2, axis=1)
+            best_d2[rows] = d2[np.arange(len(rows)), col]
+            best_idx[rows] = np.where(np.isfinite(best_d2[rows]), cand[col], -1)
+
+    keys = index.keys
+    return [
+        (keys[i], math.sqrt(d)) if i >= 0 else (None, None)
+        for i, d in zip(best_idx.tolist(), best_d2.tolist())
+    ]
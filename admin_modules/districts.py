@@ -0,0 +1,208 @@
+"""Partition of a plan into k districts of about the same number of households.
+
+A district is a connected group of streets (along the adjacency graph of
+admin_modules/graph.py) that a team can book as a whole. Stored per street
+as "district": number (0..k-1).
+
+Region growing: k seeds spread over the area (farthest point sampling),
+then the district with the fewest households so far takes its next street,
+the unassigned neighbor closest to its seed. A district that is boxed in
+stops growing; once all are boxed in, the lightest one jumps to the
+nearest unassigned street (streets without neighbors, parts cut off by a
+river). A refinement pass then moves boundary streets from the heavier to
+the lighter side as long as that evens out the households; streets that
+would be cut off from their district by such a move go along with it.
+"""
+
+import heapq
+import math
+
+from .graph import NEIGHBORS_FIELD, build_adjacency
+from .spatial import LocalProjection
+
+DISTRICT_FIELD = 'district'
+
+REFINE_PASSES = 10
+
+
+def _centers(streets):
+    """Projected (x, y) in m of every street's marker point."""
+    pts = {s_id: s['coords'] for s_id, s in streets.items() if s.get('coords')}
+    for s_id, s in streets.items():
+        if s_id not in pts and s.get('path') and s['path'][0]:
+            pts[s_id] = s['path'][0][0]
+    if not pts:
+        return {}
+    lat0 = sum(p[0] for p in pts.values()) / len(pts)
+    lon0 = sum(p[1] for p in pts.values()) / len(pts)
+    proj = LocalProjection(lat0, lon0)
+    return {s_id: proj(p[0], p[1]) for s_id, p in pts.items()}
+
+
+def _adjacency(streets):
+    """{id: [neighbor ids]} from the stored graph, computed if it is missing."""
+    if all(NEIGHBORS_FIELD in s for s in streets.values() if s.get('path')):
+        graph = {s_id: s.get(NEIGHBORS_FIELD, []) for s_id, s in streets.items()}
+    else:
+        graph = build_adjacency(streets)
+    return {s_id: [n[0] for n in graph.get(s_id, []) if n[0] in streets] for s_id in streets}
+
+
+def _seeds(ids, center, k):
+    """k streets spread over the area: each one farthest from those picked before."""
+    cx = sum(center[i][0] for i in ids) / len(ids)
+    cy = sum(center[i][1] for i in ids) / len(ids)
+    first = max(ids, key=lambda i: (math.hypot(center[i][0] - cx, center[i][1] - cy), i))
+    seeds = [first]
+    gap = {i: math.hypot(center[i][0] - center[first][0], center[i][1] - center[first][1]) for i in ids}
+    while len(seeds) < k:
+        nxt = max(ids, key=lambda i: (gap[i], i))
+        seeds.append(nxt)
+        nx, ny = center[nxt]
+        for i in ids:
+            d = math.hypot(center[i][0] - nx, center[i][1] - ny)
+            if d < gap[i]:
+                gap[i] = d
+    return seeds
+
+
+def _cut_off(s_id, members, adj):
+    """Streets of district 'members' that lose the connection without street s_id.
+
+    Empty if the district stays connected; otherwise all pieces except the
+    largest one.
+    """
+    targets = [n for n in adj[s_id] if n in members]
+    if len(targets) <= 1:
+        return set()
+    todo = set(targets[1:])
+    stack, seen = [targets[0]], {s_id, targets[0]}
+    while stack and todo:
+        for n in adj[stack.pop()]:
+            if n in members and n not in seen:
+                seen.add(n)
+                todo.discard(n)
+                stack.append(n)
+    if not todo:
+        return set()
+
+    pieces = []
+    seen = {s_id}
+    for start in targets:
+        if start in seen:
+            continue
+        piece, stack = {start}, [start]
+        seen.add(start)
+        while stack:
+            for n in adj[stack.pop()]:
+                if n in members and n not in seen:
+                    seen.add(n)
+                    piece.add(n)
+                    stack.append(n)
+        pieces.append(piece)
+    pieces.remove(max(pieces, key=len))
+    return set().union(*pieces)
+
+
+def partition(streets, k):
+    """Splits the streets into k districts. Returns ({street id: district}, stats).
+
+    stats = {"districts", "households": [per district], "target", "moved"};
+    "moved" counts the refinement moves.
+    """
+    center = _centers(streets)
+    ids = sorted(center)
+    k = max(1, min(k, len(ids)))
+    if not ids:
+        return {}, {"districts": 0, "households": [], "target": 0, "moved": 0}
+    adj = _adjacency(streets)
+    weight = {s_id: max(0, int(streets[s_id].get('households', 0) or 0)) for s_id in ids}
+    target = sum(weight.values()) / k
+
+    def dist(a, b):
+        return math.hypot(center[a][0] - center[b][0], center[a][1] - center[b][1])
+
+    # --- Region growing ---
+    seeds = _seeds(ids, center, k)
+    district = {}
+    load = [0] * k
+    frontier = [[] for _ in range(k)]
+
+    def take(s_id, d):
+        district[s_id] = d
+        load[d] += weight[s_id]
+        for n in adj[s_id]:
+            if n not in district and n in center:
+                heapq.heappush(frontier[d], (dist(n, seeds[d]), n))
+
+    for d, s_id in enumerate(seeds):
+        take(s_id, d)
+    unassigned = set(ids) - set(seeds)
+    # Lightest district first; boxed-in districts are left out until all are
+    growing = [(load[d], d) for d in range(k)]
+    heapq.heapify(growing)
+    while unassigned:
+        if growing:
+            _, d = heapq.heappop(growing)
+            f = frontier[d]
+            while f and f[0][1] in district:
+                heapq.heappop(f)
+            if not f:
+                continue
+            s_id = heapq.heappop(f)[1]
+        else:
+            d = min(range(k), key=lambda i: (load[i], i))
+            s_id = min(unassigned, key=lambda i: (dist(i, seeds[d]), i))
+        take(s_id, d)
+        unassigned.discard(s_id)
+        if not growing:
+            growing = [(load[i], i) for i in range(k) if frontier[i]]
+            heapq.heapify(growing)
+        else:
+            heapq.heappush(growing, (load[d], d))
+
+    # --- Refinement: boundary moves from heavy to light ---
+    members = [set() for _ in range(k)]
+    for s_id, d in district.items():
+        members[d].add(s_id)
+    moved = 0
+    for _ in range(REFINE_PASSES):
+        changed = 0
+        for s_id in ids:
+            a = district[s_id]
+            w = weight[s_id]
+            if len(members[a]) == 1 or load[a] <= target:
+                continue
+            # Lightest neighboring district that gets closer to the heavy one by taking the street
+            options = {district[n] for n in adj[s_id]} - {a}
+            best = min(options, key=lambda b: (load[b], b), default=None)
+            if best is None or not 0 < w < load[a] - load[best]:
+                continue
+            # Parts of the district hanging on this street go along with it
+            group = _cut_off(s_id, members[a], adj) | {s_id}
+            w = sum(weight[g] for g in group)
+            if w >= load[a] - load[best] or len(group) >= len(members[a]):
+                continue
+            for g in group:
+                district[g] = best
+            members[a] -= group
+            members[best] |= group
+            load[a] -= w
+            load[best] += w
+            changed += len(group)
+        moved += changed
+        if not changed:
+            break
+
+    return district, {"districts": k, "households": load, "target": round(target), "moved": moved}
+
+
+def assign_districts(streets, k):
+    """Stores the districts in the streets (DISTRICT_FIELD). Returns the stats of partition()."""
+    district, stats = partition(streets, k)
+    for s_id, s in streets.items():
+        if s_id in district:
+            s[DISTRICT_FIELD] = district[s_id]
+        else:
+            s.pop(DISTRICT_FIELD, None)
+    return stats
@@ -0,0 +1,62 @@
+"""Street adjacency of a plan: which streets touch or nearly touch each other.
+
+Built once per plan (admin.py) and stored per street as
+  "neighbors": [[street id, distance in m], ...]   nearest first
+Streets joined at a shared OSM node have distance 0, T-junctions without a
+shared node and parallel streets get their smallest gap. The page reads
+the graph from /api/neighbors instead of comparing all points of all
+streets on every click.
+"""
+
+from .assign import build_segment_index, make_projection
+from .spatial import point_segment_dist2
+
+NEIGHBORS_FIELD = 'neighbors'
+
+# Same threshold the page used for "Angrenzend"
+NEIGHBOR_DIST_M = 40.0
+
+
+def build_adjacency(streets, max_dist_m=NEIGHBOR_DIST_M):
+    """{street id: [[neighbor id, distance in m], ...]} for all streets with a path.
+
+    The distance of two streets is the smallest distance of a vertex of one
+    to a segment of the other, which is exact unless they cross between
+    vertices (then both count as touching anyway).
+    """
+    paths = {s_id: s['path'] for s_id, s in streets.items() if s.get('path')}
+    proj = make_projection(paths)
+    index = build_segment_index(paths, proj, max_dist_m)
+    max2 = max_dist_m * max_dist_m
+
+    best = {}
+    for s_id, lines in paths.items():
+        for line in lines:
+            for lat, lon in line:
+                x, y = proj(lat, lon)
+                for k in index.candidates(x, y, max_dist_m):
+                    other = index.keys[k]
+                    if other == s_id:
+                        continue
+                    d2 = point_segment_dist2(x, y, *index.segments[k])
+                    if d2 < max2:
+                        pair = (s_id, other) if s_id < other else (other, s_id)
+                        if d2 < best.get(pair, max2):
+                            best[pair] = d2
+
+    graph = {s_id: [] for s_id in paths}
+    for (a, b), d2 in best.items():
+        d = round(d2 ** 0.5, 1)
+        graph[a].append([b, d])
+        graph[b].append([a, d])
+    for neighbors in graph.values():
+        neighbors.sort(key=lambda n: (n[1], n[0]))
+    return graph
+
+
+def add_neighbors(streets, max_dist_m=NEIGHBOR_DIST_M):
+    """Stores the adjacency in the streets (NEIGHBORS_FIELD). Returns the number of edges."""
+    graph = build_adjacency(streets, max_dist_m)
+    for s_id, s in streets.items():
+        s[NEIGHBORS_FIELD] = graph.get(s_id, [])
+    return sum(len(n) for n in graph.values()) // 2
@@ -0,0 +1,122 @@
+"""All address points of a plan area, for counting houses near a drawn line.
+
+The plan build writes them next to the plan file (see house_index_path):
+  {"version": 1, "cell_size": degrees, "bbox": [min_lat, min_lon, max_lat, max_lon],
+   "count": n, "cells": {"i:j": polyline6 string of the points in grid cell (i, j)}}
+The server loads the file once per change and answers /admin/count_houses
+from it in a few milliseconds instead of asking Overpass.
+"""
+
+import json
+import math
+import os
+import threading
+
+from .polyline import decode_line, encode_line
+from .spatial import M_PER_DEG, LocalProjection, path_bbox, point_segment_dist2
+
+VERSION = 1
+CELL_SIZE = 0.002  # degrees, ~200 m
+
+# Same distance as the former Overpass query (around:35)
+COUNT_RADIUS_M = 35.0
+
+
+def house_index_path(plan_file):
+    """data/streets_status.json -> data/streets_status.houses.json"""
+    return os.path.splitext(plan_file)[0] + '.houses.json'
+
+
+def write_house_index(path, points, cell_size=CELL_SIZE):
+    """Writes [(lat, lon), ...] as house index file."""
+    cells = {}
+    for lat, lon in points:
+        cells.setdefault((math.floor(lat / cell_size), math.floor(lon / cell_size)), []).append([lat, lon])
+    doc = {
+        "version": VERSION,
+        "cell_size": cell_size,
+        "bbox": path_bbox([points]),
+        "count": len(points),
+        "cells": {f"{i}:{j}": encode_line(sorted(pts)) for (i, j), pts in sorted(cells.items())}
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+class HouseIndex:
+    def __init__(self, doc):
+        self.cell_size = doc['cell_size']
+        self.bbox = doc['bbox']
+        self.cells = {}
+        for key, s in doc['cells'].items():
+            i, j = key.split(':')
+            self.cells[(int(i), int(j))] = decode_line(s)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def covers(self, line):
+        """True if every point of the line lies within the indexed area."""
+        b = self.bbox
+        return bool(b) and all(b[0] <= p[0] <= b[2] and b[1] <= p[1] <= b[3] for p in line)
+
+    def count_near(self, line, radius_m=COUNT_RADIUS_M):
+        """Number of address points closer than radius_m to the line [[lat, lon], ...]."""
+        if not line:
+            return 0
+        proj = LocalProjection(line[0][0], line[0][1])
+        pad_lat = radius_m / M_PER_DEG
+        pad_lon = radius_m / proj.kx
+        r2 = radius_m * radius_m
+        cs = self.cell_size
+        segments = list(zip(line, line[1:])) or [(line[0], line[0])]
+
+        seen = set()
+        for a, b in segments:
+            ax, ay = proj(a[0], a[1])
+            bx, by = proj(b[0], b[1])
+            i0 = math.floor((min(a[0], b[0]) - pad_lat) / cs)
+            i1 = math.floor((max(a[0], b[0]) + pad_lat) / cs)
+            j0 = math.floor((min(a[1], b[1]) - pad_lon) / cs)
+            j1 = math.floor((max(a[1], b[1]) + pad_lon) / cs)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    for k, p in enumerate(self.cells.get((i, j), ())):
+                        if (i, j, k) in seen:
+                            continue
+                        px, py = proj(p[0], p[1])
+                        if point_segment_dist2(px, py, ax, ay, bx, by) < r2:
+                            seen.add((i, j, k))
+        return len(seen)
+
+
+class HouseIndexFile:
+    """HouseIndex of a file, reloaded when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.loads = 0
+        self._mtime = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The current HouseIndex, or None if there is no (readable) file."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    self._index = HouseIndex.from_file(self.path)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Konnte Haus-Index nicht laden: {e}")
+                    self._index = None
+                self._mtime = mtime
+                self.loads += 1
+            return self._index
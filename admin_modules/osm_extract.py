@@ -0,0 +1,199 @@
+"""Plan data from a local OSM extract (.osm, .osm.gz, .osm.bz2, .osm.pbf) instead of Overpass.
+
+read_extract() returns the same (data_s, data_h) as
+overpass.get_overpass_data(): named highways with 'geometry' and address
+objects with a position or 'center', for everything inside the postal
+code boundaries of the given PLZ.
+
+The extract is streamed several times and every pass only keeps what the
+next one needs, so memory grows with the PLZ area, not with the file:
+  1. relations: PLZ boundaries (member ways) and address relations
+  2. ways:      node refs of the boundary ways
+  3. nodes:     boundary coordinates -> polygon and its bbox
+  4. nodes/ways: coordinates within the bbox, address nodes, wanted ways
+  5. nodes:     coordinates of wanted ways outside the bbox (if any)
+XML only needs the standard library, PBF needs pyosmium >= 3.6.
+"""
+
+import bz2
+import gzip
+import re
+import xml.etree.ElementTree as ET
+
+from .spatial import PolygonIndex
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+_PBF_TYPES = {'n': 'node', 'w': 'way', 'r': 'relation'}
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _iter_xml(path, types):
+    with _open(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end' or elem.tag not in ('node', 'way', 'relation'):
+                continue
+            if elem.tag in types and elem.get('action') != 'delete' and elem.get('visible') != 'false':
+                osm_id = int(elem.get('id'))
+                tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+                if elem.tag == 'node':
+                    yield 'node', osm_id, (float(elem.get('lat')), float(elem.get('lon'))), tags
+                elif elem.tag == 'way':
+                    yield 'way', osm_id, [int(nd.get('ref')) for nd in elem.iter('nd')], tags
+                else:
+                    members = [(m.get('type'), int(m.get('ref')), m.get('role') or '') for m in elem.iter('member')]
+                    yield 'relation', osm_id, members, tags
+            # Drop everything parsed so far
+            root.clear()
+
+
+def _iter_pbf(path, types):
+    entities = 0
+    for t in types:
+        entities |= {'node': osmium.osm.NODE, 'way': osmium.osm.WAY, 'relation': osmium.osm.RELATION}[t]
+    for o in osmium.FileProcessor(path, entities):
+        tags = {t.k: t.v for t in o.tags}
+        if o.is_node():
+            if o.location.valid():
+                yield 'node', o.id, (o.location.lat, o.location.lon), tags
+        elif o.is_way():
+            yield 'way', o.id, [n.ref for n in o.nodes], tags
+        else:
+            yield 'relation', o.id, [(_PBF_TYPES[m.type], m.ref, m.role) for m in o.members], tags
+
+
+def iter_elements(path, types):
+    """Streams (type, id, payload, tags) of the given element types. Payload is
+    (lat, lon) for nodes, node refs for ways and (type, ref, role) members for relations."""
+    if path.endswith('.pbf'):
+        return _iter_pbf(path, types)
+    return _iter_xml(path, types)
+
+
+def read_extract(path, plz_liste, highway_re):
+    """(data_s, data_h) for the PLZ from a local extract, or (None, None)."""
+    if path.endswith('.pbf') and osmium is None:
+        print("❌ Für .pbf-Extrakte wird pyosmium benötigt (pip install osmium).")
+        return None, None
+    highway = re.compile(highway_re)
+    wanted = set(plz_liste)
+
+    print(f"📂 Lese OSM-Extrakt {path} für {', '.join(plz_liste)}...")
+
+    # 1. Boundaries and address relations
+    boundaries = {}  # relation id -> member way ids, one polygon per PLZ
+    found_plz = set()
+    addr_rels = {}
+    for _, osm_id, members, tags in iter_elements(path, ('relation',)):
+        if tags.get('postal_code') in wanted and tags.get('type') in ('boundary', 'multipolygon'):
+            found_plz.add(tags['postal_code'])
+            boundaries[osm_id] = [ref for t, ref, _ in members if t == 'way']
+        elif 'addr:housenumber' in tags:
+            addr_rels[osm_id] = ([ref for t, ref, _ in members if t == 'way'], tags)
+    missing = wanted - found_plz
+    if missing:
+        print(f"❌ Keine PLZ-Grenze für {', '.join(sorted(missing))} im Extrakt.")
+        return None, None
+
+    # 2./3. Boundary polygons (separately: a way shared by two PLZ is an edge of both)
+    boundary_ways = {w for ways in boundaries.values() for w in ways}
+    boundary_refs = {}
+    for _, osm_id, refs, _ in iter_elements(path, ('way',)):
+        if osm_id in boundary_ways:
+            boundary_refs[osm_id] = refs
+    needed = {r for refs in boundary_refs.values() for r in refs}
+    coords = {}
+    for _, osm_id, latlon, _ in iter_elements(path, ('node',)):
+        if osm_id in needed:
+            coords[osm_id] = latlon
+    areas = []
+    for rel_id in sorted(boundaries):
+        edges = []
+        for w in boundaries[rel_id]:
+            refs = boundary_refs.get(w, [])
+            edges.extend((coords[a], coords[b]) for a, b in zip(refs, refs[1:]) if a in coords and b in coords)
+        if edges:
+            areas.append(PolygonIndex(edges))
+    if not areas:
+        print("❌ PLZ-Grenze ist im Extrakt unvollständig.")
+        return None, None
+
+    def in_bbox(lat, lon):
+        return any(a.in_bbox(lat, lon) for a in areas)
+
+    def in_area(lat, lon):
+        return any(a.contains(lat, lon) for a in areas)
+
+    # 4. Everything within the boundary (a way counts as soon as one node is inside, like Overpass)
+    rel_ways = {w for ways, _ in addr_rels.values() for w in ways}
+    coords = {}
+    inside = {}
+    houses = []
+    streets = []
+    house_ways = []
+    member_refs = {}
+
+    def is_inside(ref):
+        if ref not in inside:
+            inside[ref] = ref in coords and in_area(*coords[ref])
+        return inside[ref]
+
+    for kind, osm_id, payload, tags in iter_elements(path, ('node', 'way')):
+        if kind == 'node':
+            if in_bbox(*payload):
+                coords[osm_id] = payload
+                if 'addr:housenumber' in tags and is_inside(osm_id):
+                    houses.append({'type': 'node', 'id': osm_id, 'lat': payload[0], 'lon': payload[1], 'tags': tags})
+            continue
+        is_street = 'name' in tags and highway.search(tags.get('highway', ''))
+        is_house = 'addr:housenumber' in tags
+        if osm_id in rel_ways and any(r in coords for r in payload):
+            member_refs[osm_id] = payload
+        if (is_street or is_house) and any(is_inside(r) for r in payload):
+            if is_street: streets.append((osm_id, payload, tags))
+            if is_house: house_ways.append((osm_id, payload, tags))
+
+    house_rels = [(osm_id, [w for w in ways if w in member_refs], tags)
+                  for osm_id, (ways, tags) in addr_rels.items()
+                  if any(is_inside(r) for w in ways for r in member_refs.get(w, ()))]
+
+    # 5. Nodes of wanted ways that lie outside the bbox
+    outside = {r for _, refs, _ in streets + house_ways for r in refs if r not in coords}
+    outside.update(r for _, ways, _ in house_rels for w in ways for r in member_refs[w] if r not in coords)
+    if outside:
+        for _, osm_id, latlon, _ in iter_elements(path, ('node',)):
+            if osm_id in outside:
+                coords[osm_id] = latlon
+
+    def center(refs):
+        pts = [coords[r] for r in refs if r in coords]
+        lats, lons = [p[0] for p in pts], [p[1] for p in pts]
+        return {'lat': (min(lats) + max(lats)) / 2, 'lon': (min(lons) + max(lons)) / 2}
+
+    # Same element order as Overpass: by type, then id
+    data_s = {'elements': [
+        {'type': 'way', 'id': osm_id, 'tags': tags,
+         'geometry': [{'lat': coords[r][0], 'lon': coords[r][1]} for r in refs if r in coords]}
+        for osm_id, refs, tags in sorted(streets, key=lambda s: s[0])
+    ]}
+    elements = sorted(houses, key=lambda h: h['id'])
+    elements += [{'type': 'way', 'id': osm_id, 'center': center(refs), 'tags': tags}
+                 for osm_id, refs, tags in sorted(house_ways, key=lambda h: h[0])]
+    elements += [{'type': 'relation', 'id': osm_id, 'center': center([r for w in ways for r in member_refs[w]]), 'tags': tags}
+                 for osm_id, ways, tags in sorted(house_rels, key=lambda h: h[0])]
+    data_h = {'elements': elements}
+
+    print(f"✅ {len(data_s['elements'])} Straßenabschnitte und {len(elements)} Adressen aus dem Extrakt.")
+    return data_s, data_h
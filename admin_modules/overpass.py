@@ -1,111 +1,186 @@
-import requests
+import bisect
 import json
-import os
 import math
-import time
+import os
+import re
+from functools import partial
 from .geo import haversine
+from .simplify import build_lod
+from .spatial import M_PER_DEG, path_bbox
+from .split import orient, part_count, split_ways
+from .assign import nearest_streets
+from .osm_extract import read_extract
+from .overpass_scheduler import OverpassScheduler
+from .raw_cache import KINDS, RawCache
+from .stream_json import ElementStream, iter_elements
+from .tiles import PARALLEL_MIN_HOUSES, PARALLEL_MIN_STREETS, build_workers, map_streets, nearest_streets_tiled
 
 try:
     import config
 except ImportError:
     config = None
 
-def fetch_overpass_data(query):
-    url = getattr(config, 'OVERPASS_URL', "http://overpass-api.de/api/interpreter")
-    for attempt in range(3):
-        try:
-            response = requests.post(url, data={'data': query}, timeout=120)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"⚠️ API-Versuch {attempt+1} fehlgeschlagen: {e}")
-            time.sleep(5)
-    return None
+# Street classes of a plan (regex, unanchored like in Overpass)
+HIGHWAY_RE = "primary|secondary|tertiary|unclassified|residential|living_street|pedestrian"
 
-def sort_paths_spatially(paths):
-    """Sorts a list of paths (segments) geographically to ensure continuity."""
-    if not paths: return []
-    
-    # 1. Calculate centers of each segment
-    centers = []
-    all_lats, all_lons = [], []
-    for p in paths:
-        if not p: continue
-        # Average lat/lon of the segment
-        c_lat = sum(x[0] for x in p) / len(p)
-        c_lon = sum(x[1] for x in p) / len(p)
-        centers.append({'lat': c_lat, 'lon': c_lon, 'path': p})
-        all_lats.append(c_lat)
-        all_lons.append(c_lon)
-    
-    if not centers: return paths
+# A house whose addr:street names a street of the plan is assigned to it directly,
+# if it lies within this distance of the street's bounding box
+ADDR_STREET_MAX_M = 100.0
 
-    # 2. Determine principal axis (Lat or Lon)
-    lat_span = max(all_lats) - min(all_lats)
-    lon_span = max(all_lons) - min(all_lons)
-    
-    # 3. Sort
-    # Ideally we would chain them by connectivity, but sorting by main axis 
-    # is a robust 95% solution for splitting streets into "North/South" or "East/West" parts.
-    if lat_span > lon_span:
-        centers.sort(key=lambda x: x['lat'])
-    else:
-        centers.sort(key=lambda x: x['lon'])
-        
-    return [x['path'] for x in centers]
-
-def dist_point_to_segments(lat, lon, paths):
-    """Returns min distance from point to any segment in paths."""
-    min_d = float('inf')
-    for path in paths:
-        # Check all points in path (simplified)
-        for p in path: # Check all nodes for accuracy
-            d = (lat - p[0])**2 + (lon - p[1])**2 # Squared Euclidean (approx)
-            if d < min_d: min_d = d
-    return math.sqrt(min_d)
-
-def get_overpass_data(plz_liste):
-    """Fetches raw data from Overpass or loads from raw cache."""
-    cache_dir = "cache"
-    os.makedirs(cache_dir, exist_ok=True)
-    cache_key = "_".join(sorted(plz_liste))
-    raw_cache_file = os.path.join(cache_dir, f"raw_{cache_key}.json")
-
-    if os.path.exists(raw_cache_file):
-        print(f"📂 Lade RAW-Daten aus Cache ({raw_cache_file})...")
-        try:
-            with open(raw_cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data['streets'], data['houses']
-        except Exception as e:
-            print(f"⚠️ Fehler beim Laden des Raw-Cache: {e}")
+# What a plan needs per PLZ: (selector within area .a, output mode)
+SELECTORS = {
+    'streets': (f'way["highway"~"{HIGHWAY_RE}"]["name"](area.a)', 'geom'),
+    'houses': ('nwr["addr:housenumber"](area.a)', 'center'),
+}
 
-    print(f"🔍 Suche ALLES: Straßen, Adresspunkte und Hausumrisse für {', '.join(plz_liste)}...")
-    area_filters = "".join([f'area["postal_code"="{p}"];' for p in plz_liste])
-    
-    # Query 1: Streets with geometry
-    q_streets = f'[out:json][timeout:90];({area_filters})->.a; way["highway"~"primary|secondary|tertiary|unclassified|residential|living_street|pedestrian"]["name"](area.a); out geom;'
-    
-    # Query 2: Addresses
-    q_houses = f'[out:json][timeout:90];({area_filters})->.a; nwr["addr:housenumber"](area.a); out center;'
+def plz_queries(plz):
+    """(streets, houses) queries for one PLZ."""
+    area_filter = f'area["postal_code"="{plz}"]'
+    # Query 1: Streets with geometry, Query 2: Addresses
+    return tuple(f'[out:json][timeout:90];{area_filter}->.a; {sel}; out {out};' for sel, out in (SELECTORS[k] for k in KINDS))
+
+def refresh_query(plz, kind, since):
+    """Query for what changed in one cached PLZ/kind since the OSM timestamp 'since'.
+
+    Answers the elements that are new or modified since then in full (ways
+    also when only one of their nodes moved), followed by the bare ids of
+    everything that matches now - cached elements missing there were
+    deleted or no longer match.
+    """
+    sel, out = SELECTORS[kind]
+    return (f'[out:json][timeout:90];area["postal_code"="{plz}"]->.a; {sel}->.all; '
+            f'node(w.all)(newer:"{since}")->.moved; (nwr.all(newer:"{since}"); way.all(bn.moved);); out {out}; '
+            f'.all out ids;')
+
+def apply_refresh(cached, diff, counts):
+    """Patches cached Overpass elements with the elements of a refresh_query() answer.
+
+    Yields the new elements while streaming through cached; counts gets
+    "added", "changed" and "removed" once they are all consumed.
+    """
+    current = set()
+    fresh = {}
+    for el in diff:
+        key = (el.get('type'), el.get('id'))
+        # 'out ids' elements carry nothing but type and id
+        if len(el) > 2: fresh[key] = el
+        else: current.add(key)
+
+    changed = removed = 0
+    for el in cached:
+        key = (el.get('type'), el.get('id'))
+        if key not in current:
+            removed += 1
+            continue
+        if key in fresh:
+            el = fresh.pop(key)
+            changed += 1
+        yield el
+    added = 0
+    for key, el in fresh.items():
+        if key in current:
+            added += 1
+            yield el
+    counts.update(added=added, changed=changed, removed=removed)
 
-    data_s = fetch_overpass_data(q_streets)
-    data_h = fetch_overpass_data(q_houses)
+def update_cache(pairs, cache, scheduler=None):
+    """Fetches (plz, kind) pairs into the raw cache: incrementally (refresh_query) where an
+    older entry with OSM timestamp exists, completely otherwise. Returns the set of
+    successful pairs."""
+    if not pairs: return set()
+    scheduler = scheduler or OverpassScheduler()
+    bases = {}
+    queries = []
+    for plz, kind in pairs:
+        meta = cache.meta(plz, kind)
+        bases[(plz, kind)] = meta and meta['osm_base']
+        if bases[(plz, kind)]:
+            queries.append(refresh_query(plz, kind, bases[(plz, kind)]))
+        else:
+            queries.append(dict(zip(KINDS, plz_queries(plz)))[kind])
+    # Answers go straight to disk, they are only ever streamed (see stream_json.py)
+    paths = [cache.download_path(plz, kind) for plz, kind in pairs]
 
-    if data_s and data_h:
+    done = set()
+    for (plz, kind), res in zip(pairs, scheduler.fetch_all(queries, paths)):
+        if res is None: continue
         try:
-            with open(raw_cache_file, 'w', encoding='utf-8') as f:
-                json.dump({'streets': data_s, 'houses': data_h}, f)
+            if bases[(plz, kind)]:
+                diff_kb = os.path.getsize(res) / 1024
+                with open(res, 'r', encoding='utf-8') as f:
+                    diff = list(iter_elements(f))
+                counts = {}
+                size = cache.put_elements(plz, kind, apply_refresh(cache.elements(plz, kind), diff, counts), res)
+                print(f"🔄 {plz} {kind}: +{counts['added']} neu, {counts['changed']} geändert, "
+                      f"-{counts['removed']} entfernt ({diff_kb:.0f} KB statt {size / 1024:.0f} KB)")
+            else:
+                cache.put_file(plz, kind, res)
         except Exception as e:
-             print(f"⚠️ Fehler beim Speichern des Raw-Cache: {e}")
+            print(f"⚠️ Fehler beim Speichern des Raw-Cache: {e}")
+            cache.discard_download(plz, kind)
+            continue
+        done.add((plz, kind))
+    return done
+
+def get_overpass_data(plz_liste, cache=None):
+    """Fetches raw data from Overpass or loads it from the raw cache (per PLZ, see raw_cache.py).
+    With config OSM_EXTRACT set, reads a local OSM extract instead.
+
+    The elements are ElementStreams over the cache files: they are parsed
+    again on every pass and never held in memory as a whole.
+    """
+    extract = getattr(config, 'OSM_EXTRACT', None) if config else None
+    if extract:
+        return read_extract(extract, plz_liste, HIGHWAY_RE)
+
+    cache = cache or RawCache()
+    found = set()
+    missing = []
+    for plz in plz_liste:
+        for kind in KINDS:
+            if cache.fresh(plz, kind):
+                found.add((plz, kind))
+            else:
+                missing.append((plz, kind))
+
+    if found:
+        cached = [p for p in plz_liste if any((p, k) in found for k in KINDS)]
+        print(f"📂 Lade RAW-Daten aus Cache für {', '.join(cached)}...")
+
+    if missing:
+        print(f"🔍 Suche ALLES: Straßen, Adresspunkte und Hausumrisse für {', '.join(sorted(set(p for p, _ in missing)))}...")
+        # One query per PLZ and kind instead of one huge area query (see overpass_scheduler.py),
+        # expired entries only fetch what changed since
+        found.update(update_cache(missing, cache))
 
+    print(cache.report())
+
+    failed = [p for p in plz_liste if any((p, k) not in found for k in KINDS)]
+    if failed:
+        print(f"❌ Keine Daten für PLZ {', '.join(failed)}.")
+        return None, None
+
+    # Ways on a PLZ border come with both PLZ, ElementStream keeps them once
+    data_s = {'elements': ElementStream([partial(cache.elements, p, 'streets') for p in plz_liste])}
+    data_h = {'elements': ElementStream([partial(cache.elements, p, 'houses') for p in plz_liste])}
     return data_s, data_h
 
-def process_streets(data_s, data_h, radius_threshold_m=45):
-    """Processes raw Overpass data and assigns houses to streets."""
-    if not data_s or not data_h:
-        return {}, [], {}
+def refresh_cache(plz_liste=None, cache=None):
+    """Brings cached PLZ (default: all) up to date with what changed in OSM since they were fetched."""
+    cache = cache or RawCache()
+    plz_liste = plz_liste or cache.cached_plz()
+    if not plz_liste:
+        print("Cache ist leer.")
+        return set()
+    print(f"🔄 Aktualisiere Cache für {', '.join(plz_liste)}...")
+    done = update_cache([(plz, kind) for plz in plz_liste for kind in KINDS], cache)
+    failed = len(plz_liste) * len(KINDS) - len(done)
+    if failed:
+        print(f"⚠️ {failed} Einträge konnten nicht aktualisiert werden.")
+    return done
 
+def build_raw_streets(data_s):
+    """Groups the ways by street name. Returns (raw_streets, coords_list)."""
     raw_streets = {} 
     coords_list = []
 
@@ -140,171 +215,280 @@ def process_streets(data_s, data_h, radius_threshold_m=45):
                     "status": "free", 
                     "user": "", 
                     "paths": [],
-                    "house_coords": [] # List of {lat, lon, w}
+                    "house_coords": [], # List of {lat, lon, w}
+                    "house_ways": [] # Nearest way (index in paths) per house
                 }
             
             raw_streets[s_id_base]["length"] += length
             raw_streets[s_id_base]["paths"].append(nodes)
 
-    # 2. Assign Households to Streets
-    elements = data_h.get('elements', [])
-    total_houses_found = len(elements)
-    assigned_houses_count = 0
-    
-    # print(f"🏠 Verarbeite {total_houses_found} gefundene Adress-Objekte...") # Moved to stats return
-    
-    THRESHOLD = radius_threshold_m / 111320.0
-    GRID_SIZE = 0.001 
-    
-    street_grid = {}
-    def get_grid_key(lat, lon): return (int(lat / GRID_SIZE), int(lon / GRID_SIZE))
+    return raw_streets, coords_list
 
-    for s_id, s_data in raw_streets.items():
-        for path in s_data["paths"]:
-            for n in path[::5]: 
-                key = get_grid_key(n[0], n[1])
-                if key not in street_grid: street_grid[key] = set()
-                street_grid[key].add(s_id)
-                
-    for h in elements:
+def house_weight(tags):
+    """Households of an address object (addr:flats, else a guess from the building type)."""
+    weight = 1
+    if 'addr:flats' in tags:
+        try:
+            flats_val = tags['addr:flats']
+            if '-' in flats_val:
+                parts = flats_val.split('-')
+                weight = max(1, int(parts[1]) - int(parts[0]) + 1)
+            else:
+                weight = max(1, int(flats_val))
+        except: pass
+    elif tags.get('building') in ['apartments', 'dormitory', 'terrace']:
+        weight = 6
+    return weight
+
+def house_points(data_h):
+    """Address objects with a position as (lat, lon, weight, addr:street or None), and the
+    number of all address objects. Keeps nothing else of the elements, so data_h may be a stream."""
+    houses = []
+    total = 0
+    for h in data_h.get('elements', []):
+        total += 1
         h_lat = h.get('lat') or h.get('center', {}).get('lat')
         h_lon = h.get('lon') or h.get('center', {}).get('lon')
         if not h_lat: continue
+        tags = h.get('tags', {})
+        houses.append((h_lat, h_lon, house_weight(tags), tags.get('addr:street')))
+    return houses, total
 
-        min_d = 999
-        best_id = None
-        
-        g_lat, g_lon = get_grid_key(h_lat, h_lon)
-        candidates = set()
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                k = (g_lat + dx, g_lon + dy)
-                if k in street_grid: candidates.update(street_grid[k])
-        
-        for s_id in candidates:
-            s_data = raw_streets[s_id]
-            # Use improved check
-            d = dist_point_to_segments(h_lat, h_lon, s_data["paths"])
-            if d < min_d:
-                min_d = d
-                best_id = s_id
+_STRASSE_RE = re.compile(r'(str\.|strasse)(?=\s|$)')
+
+def street_key(name):
+    """Street name for matching addr:street: case, blanks, dashes and 'Str.'/'Strasse' don't matter."""
+    key = ' '.join(name.lower().replace('-', ' ').split())
+    return _STRASSE_RE.sub('straße', key)
+
+def match_addr_street(raw_streets, houses, max_dist_m=ADDR_STREET_MAX_M):
+    """Street id per house from its addr:street (hash join on street_key), or None.
+
+    None for houses without the tag, with a name no street (or more than
+    one street) of the plan has, or farther than max_dist_m from the
+    bounding box of the named street - those need the geometric search.
+    """
+    by_key = {}
+    for s_id, s_data in raw_streets.items():
+        by_key.setdefault(street_key(s_data["name"]), set()).add(s_id)
+    bboxes = {}
+
+    matched = []
+    for h_lat, h_lon, _, addr in houses:
+        ids = by_key.get(street_key(addr)) if addr else None
+        if not ids or len(ids) > 1:
+            matched.append(None)
+            continue
+        s_id = next(iter(ids))
+        if s_id not in bboxes:
+            bboxes[s_id] = path_bbox(raw_streets[s_id]["paths"])
+        min_lat, min_lon, max_lat, max_lon = bboxes[s_id]
+        d_lat = max(0.0, min_lat - h_lat, h_lat - max_lat) * M_PER_DEG
+        d_lon = max(0.0, min_lon - h_lon, h_lon - max_lon) * M_PER_DEG * math.cos(math.radians(h_lat))
+        matched.append(s_id if math.hypot(d_lat, d_lon) <= max_dist_m else None)
+    return matched
+
+def way_paths(raw_streets):
+    """{(street id, way index): [way]}: assignment keys that also name the nearest way.
+
+    Same lines in the same order as {street id: paths}, so the nearest
+    street (and every tie break) is unchanged.
+    """
+    return {(s_id, i): [line] for s_id, s_data in raw_streets.items() for i, line in enumerate(s_data["paths"])}
+
+def assign_nearest(street_paths, houses, radius_m, workers=1):
+    """Nearest street of every (lat, lon, ...) house, tiled over a process pool for large areas."""
+    points = [(h[0], h[1]) for h in houses]
+    if workers > 1 and len(points) >= PARALLEL_MIN_HOUSES:
+        return nearest_streets_tiled(street_paths, points, radius_m, workers)
+    return nearest_streets(street_paths, points, radius_m)
+
+def assign_houses(raw_streets, houses, radius_m, workers=1):
+    """addr:street match or nearest way of every house: [(key, distance)] with key
+    (street id, way index) or None.
+
+    Matched houses get way None and distance 0 (the radius does not apply
+    to them); only the others are searched geometrically.
+    """
+    matched = match_addr_street(raw_streets, houses)
+    rest = [i for i, s_id in enumerate(matched) if s_id is None]
+    found = assign_nearest(way_paths(raw_streets), [houses[i] for i in rest], radius_m, workers) if rest else []
+    result = [((s_id, None), 0.0) if s_id is not None else (None, None) for s_id in matched]
+    for i, res in zip(rest, found):
+        result[i] = res
+    return result, len(houses) - len(rest)
+
+def prepare_assignment(data_s, data_h, max_radius_m, workers=None):
+    """Street of every house (geometrically up to max_radius_m), computed once.
+
+    process_streets(..., prepared=...) and radius_histogram() only
+    re-threshold these distances, for any radius up to max_radius_m.
+    """
+    raw_streets, _ = build_raw_streets(data_s)
+    houses, total = house_points(data_h)
+    nearest, by_tag = assign_houses(raw_streets, houses, max_radius_m, workers or build_workers())
+    return {
+        "max_radius": max_radius_m,
+        "total_houses": total,
+        "nearest": nearest,
+        "by_tag": by_tag,
+        "distances": sorted(d for key, d in nearest if d is not None and key[1] is not None)
+    }
+
+def radius_histogram(prepared, radii):
+    """[(radius, assigned, unassigned)] for every radius (<= max_radius) in one pass."""
+    dists = prepared["distances"]
+    total = prepared["total_houses"]
+    rows = []
+    for r in radii:
+        assigned = prepared["by_tag"] + bisect.bisect_left(dists, r)
+        rows.append((r, assigned, total - assigned))
+    return rows
+
+def finalize_street(s_id, data):
+    """Chains the ways of a street and splits it if too long. Returns {id: street}."""
+    final_streets = {}
+    paths = data["paths"]
+    house_ways = data.pop("house_ways")
+
+    should_split = data["length"] > 600 or data["households"] > 80
+    # Houses matched by addr:street have no way yet, only needed if the street is split
+    missing = [k for k, way in enumerate(house_ways) if way is None]
+    if should_split and missing:
+        way_lines = {i: [line] for i, line in enumerate(paths)}
+        found = nearest_streets(way_lines, [(data["house_coords"][k]['lat'], data["house_coords"][k]['lon']) for k in missing])
+        for k, (way, _) in zip(missing, found):
+            house_ways[k] = way
+
+    # Households per way from the assignment, for balancing the parts
+    way_households = [0] * len(paths)
+    for h, way in zip(data["house_coords"], house_ways):
+        if way is not None:
+            way_households[way] += h['w']
+
+    groups = split_ways(paths, way_households, part_count(data["length"]) if should_split else 1)
+
+    if len(groups) > 1:
+        part_of_way = {}
+        for i, group in enumerate(groups):
+            for way, _ in group:
+                part_of_way[way] = i
+
+        split_parts = []
+        for i, group in enumerate(groups):
+            seg_paths = [orient(paths[way], rev) for way, rev in group]
+            seg_len = 0
+            all_seg_nodes = []
+            for p in seg_paths:
+                all_seg_nodes.extend(p)
+                for k in range(len(p)-1):
+                    seg_len += haversine(p[k][0], p[k][1], p[k+1][0], p[k+1][1])
+
+            split_parts.append({
+                "id": f"{s_id}_part{i+1}",
+                "name": f"{data['name']} ({i+1}/{len(groups)})",
+                "paths": seg_paths,
+                "length": int(seg_len),
+                "coords": [sum(n[0] for n in all_seg_nodes) / len(all_seg_nodes),
+                           sum(n[1] for n in all_seg_nodes) / len(all_seg_nodes)],
+                "houses": [],
+                "households": 0
+            })
+
+        # Every house goes to the part containing its nearest way
+        for h, way in zip(data["house_coords"], house_ways):
+            part = split_parts[part_of_way[way]]
+            part["houses"].append(h)
+            part["households"] += h['w']
+
+        # Finalize parts
+        for part in split_parts:
+            # Ensure min households
+            if part["households"] == 0:
+                 part["households"] = max(2, int(part["length"] / 25))
+            
+            final_streets[part["id"]] = {
+                "name": part["name"],
+                "households": part["households"],
+                "length": part["length"],
+                "coords": part["coords"],
+                "path": part["paths"],
+                "path_lod": build_lod(part["paths"]), # Simplified copies for low zoom
+                "houses": part["houses"], # Include coords!
+                "status": "free",
+                "user": ""
+            }
+
+    else:
+        # No split
+        if data["households"] == 0:
+            data["households"] = max(3, int(data["length"] / 20))
         
-        if best_id and min_d < THRESHOLD:
+        chained = [orient(paths[way], rev) for way, rev in groups[0]]
+        data["path"] = chained # Ways in walking order
+        data["path_lod"] = build_lod(chained)
+        del data["paths"]
+        data["length"] = int(data["length"])
+        data["houses"] = data["house_coords"]
+        del data["house_coords"]
+        final_streets[s_id] = data
+
+    return final_streets
+
+def process_streets(data_s, data_h, radius_threshold_m=45, prepared=None, workers=None):
+    """Processes raw Overpass data and assigns houses to streets.
+
+    With 'prepared' (see prepare_assignment) the nearest streets are not
+    recomputed, as long as the radius is within its max_radius. Large
+    areas are processed in 'workers' processes (default: config
+    BUILD_WORKERS or all cores), with the same result.
+    """
+    if not data_s or not data_h:
+        return {}, [], {}
+    workers = workers or build_workers()
+
+    # 1. Process Streets
+    raw_streets, coords_list = build_raw_streets(data_s)
+
+    # 2. Assign Households to Streets
+    houses, total_houses_found = house_points(data_h)
+    assigned_houses_count = 0
+    
+    # print(f"🏠 Verarbeite {total_houses_found} gefundene Adress-Objekte...") # Moved to stats return
+    
+    # addr:street first, then nearest street segment (metric, see admin_modules/assign.py)
+    # Keys are (street id, way index), see way_paths(); way None: matched by addr:street
+    if prepared and radius_threshold_m <= prepared["max_radius"]:
+        nearest = [(key, d) if key is not None and d < radius_threshold_m else (None, None)
+                   for key, d in prepared["nearest"]]
+    else:
+        nearest, _ = assign_houses(raw_streets, houses, radius_threshold_m, workers)
+
+    by_tag = 0
+    for (h_lat, h_lon, weight, _), (key, min_d) in zip(houses, nearest):
+        if key is not None:
+            best_id, way = key
             assigned_houses_count += 1
-            weight = 1
-            tags = h.get('tags', {})
-            if 'addr:flats' in tags:
-                try:
-                    flats_val = tags['addr:flats']
-                    if '-' in flats_val:
-                        parts = flats_val.split('-')
-                        weight = max(1, int(parts[1]) - int(parts[0]) + 1)
-                    else:
-                        weight = max(1, int(flats_val))
-                except: pass
-            elif tags.get('building') in ['apartments', 'dormitory', 'terrace']:
-                weight = 6 
-            
+            by_tag += way is None
             raw_streets[best_id]["households"] += weight
             raw_streets[best_id]["house_coords"].append({'lat': h_lat, 'lon': h_lon, 'w': weight})
+            raw_streets[best_id]["house_ways"].append(way)
 
-    # 3. Post-Process: Sorting and Splitting
+    # 3. Post-Process: Sorting and Splitting (streets are independent of each other)
     final_streets = {}
-    
-    for s_id, data in raw_streets.items():
-        # Sort paths to reduce gaps when splitting
-        sorted_paths = sort_paths_spatially(data["paths"])
-        
-        should_split = data["length"] > 600 or data["households"] > 80
-        
-        if should_split and len(sorted_paths) > 1:
-            num_segments = max(2, int(data["length"] / 400))
-            num_segments = min(num_segments, len(sorted_paths))
-            
-            chunk_size = math.ceil(len(sorted_paths) / num_segments)
-            
-            split_parts = []
-            
-            # Create parts
-            for i in range(num_segments):
-                start = i * chunk_size
-                end = start + chunk_size
-                seg_paths = sorted_paths[start:end]
-                if not seg_paths: continue
-                
-                # Calc geometry
-                seg_len = 0
-                all_seg_nodes = []
-                for p in seg_paths:
-                    all_seg_nodes.extend(p)
-                    for k in range(len(p)-1):
-                        seg_len += haversine(p[k][0], p[k][1], p[k+1][0], p[k+1][1])
-                
-                if all_seg_nodes:
-                    seg_lat = sum(n[0] for n in all_seg_nodes) / len(all_seg_nodes)
-                    seg_lon = sum(n[1] for n in all_seg_nodes) / len(all_seg_nodes)
-                else:
-                    seg_lat, seg_lon = data["coords"]
-                    
-                split_parts.append({
-                    "id": f"{s_id}_part{i+1}",
-                    "name": f"{data['name']} ({i+1}/{len(sorted_paths)//chunk_size + 1 if chunk_size else num_segments})",
-                    "paths": seg_paths,
-                    "length": int(seg_len),
-                    "coords": [seg_lat, seg_lon],
-                    "houses": [],
-                    "households": 0
-                })
-
-            # Distribute houses to closest part
-            for h in data["house_coords"]:
-                best_part = None
-                min_part_d = float('inf')
-                
-                for part in split_parts:
-                    d = dist_point_to_segments(h['lat'], h['lon'], part['paths'])
-                    if d < min_part_d:
-                        min_part_d = d
-                        best_part = part
-                
-                if best_part:
-                    best_part["houses"].append(h)
-                    best_part["households"] += h['w']
-
-            # Finalize parts
-            for part in split_parts:
-                # Fix name index
-                # Ensure min households
-                if part["households"] == 0:
-                     part["households"] = max(2, int(part["length"] / 25))
-                
-                final_streets[part["id"]] = {
-                    "name": part["name"],
-                    "households": part["households"],
-                    "length": part["length"],
-                    "coords": part["coords"],
-                    "path": part["paths"],
-                    "houses": part["houses"], # Include coords!
-                    "status": "free",
-                    "user": ""
-                }
-
-        else:
-            # No split
-            if data["households"] == 0:
-                data["households"] = max(3, int(data["length"] / 20))
-            
-            data["path"] = sorted_paths # Use sorted paths
-            del data["paths"]
-            data["length"] = int(data["length"])
-            data["houses"] = data["house_coords"]
-            del data["house_coords"]
-            final_streets[s_id] = data
+    if workers > 1 and len(raw_streets) >= PARALLEL_MIN_STREETS:
+        results = map_streets(finalize_street, raw_streets, workers)
+    else:
+        results = [finalize_street(s_id, data) for s_id, data in raw_streets.items()]
+    for parts in results:
+        final_streets.update(parts)
 
     stats = {
         'total_houses': total_houses_found,
         'assigned_houses': assigned_houses_count,
         'unassigned': total_houses_found - assigned_houses_count,
+        'by_addr_street': by_tag,
+        'by_distance': assigned_houses_count - by_tag,
         'radius': radius_threshold_m
     }
     return final_streets, coords_list, stats
@@ -0,0 +1,183 @@
+"""Concurrent Overpass requests within a slot limit, across mirrors.
+
+Public Overpass instances hand out a few query slots per IP and answer
+429 (with Retry-After) when they are used up, or 504 when busy. The
+scheduler runs up to 'slots' requests at once, backs off exponentially
+(or as long as Retry-After says) and meanwhile sends the retry to the
+next mirror that is not backing off.
+
+With a target path the answer is streamed to disk instead of parsed,
+for answers too large to hold in memory (see stream_json.py).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+
+try:
+    import config
+except ImportError:
+    config = None
+
+DEFAULT_URL = "http://overpass-api.de/api/interpreter"
+
+# Answers worth another try (elsewhere or later)
+RETRY_STATUS = (429, 502, 503, 504)
+
+# The remark comes after the elements, at the very end of the answer
+_TAIL_SIZE = 4096
+_REMARK_RE = re.compile(rb'"remark"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def configured_urls():
+    """OVERPASS_URL from config, a single URL or a list of mirrors."""
+    urls = getattr(config, 'OVERPASS_URL', None) if config else None
+    if not urls:
+        return [DEFAULT_URL]
+    return [urls] if isinstance(urls, str) else list(urls)
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _discard(path):
+    """Removes a partial download (nothing to do without path)."""
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class OverpassScheduler:
+    def __init__(self, urls=None, slots=None, attempts=5, backoff=5.0, max_backoff=300.0,
+                 timeout=180, sleep=time.sleep):
+        self.urls = list(urls) if urls else configured_urls()
+        if slots is None:
+            slots = getattr(config, 'OVERPASS_SLOTS', 2) if config else 2
+        self.slots = max(1, slots)
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sleep = sleep
+
+        self.requests = 0
+        self.failures = 0
+        self._semaphore = threading.Semaphore(self.slots)
+        self._lock = threading.Lock()
+        self._blocked_until = {url: 0.0 for url in self.urls}
+        self._next = 0
+
+    def _pick_mirror(self):
+        """Next mirror in turn that is not backing off. Returns (url, seconds to wait)."""
+        with self._lock:
+            now = time.time()
+            n = len(self.urls)
+            for k in range(n):
+                url = self.urls[(self._next + k) % n]
+                if self._blocked_until[url] <= now:
+                    self._next = (self._next + k + 1) % n
+                    return url, 0.0
+            url = min(self.urls, key=lambda u: self._blocked_until[u])
+            return url, self._blocked_until[url] - now
+
+    def _block(self, url, seconds):
+        with self._lock:
+            self._blocked_until[url] = max(self._blocked_until[url], time.time() + seconds)
+
+    def _request(self, url, query, path=None):
+        """One POST. Returns (data or path, error, retry_after, retryable)."""
+        with self._semaphore:
+            with self._lock:
+                self.requests += 1
+            try:
+                resp = requests.post(url, data={'data': query}, timeout=self.timeout, stream=path is not None)
+                if path is not None and resp.ok:
+                    # Download within the slot
+                    tail = self._save(resp, path)
+            except (requests.RequestException, OSError) as e:
+                return None, str(e), None, True
+
+        if resp.status_code in RETRY_STATUS:
+            return None, f"HTTP {resp.status_code}", parse_retry_after(resp.headers.get('Retry-After')), True
+        if not resp.ok:
+            # Bad query etc. - asking again will not help
+            return None, f"HTTP {resp.status_code}", None, False
+        if path is not None:
+            m = _REMARK_RE.search(tail)
+            remark = json.loads(b'"' + m.group(1) + b'"') if m else ''
+            if 'runtime error' in remark:
+                return None, remark, None, True
+            return path, None, None, False
+        try:
+            data = resp.json()
+        except ValueError as e:
+            return None, f"Ungültiges JSON: {e}", None, True
+        remark = data.get('remark') or ''
+        if 'runtime error' in remark:
+            # Overpass reports timeouts/out of memory with status 200
+            return None, remark, None, True
+        return data, None, None, False
+
+    def _save(self, resp, path):
+        """Writes the body to path chunk by chunk. Returns its last bytes."""
+        tail = b''
+        with open(path, 'wb') as f:
+            for chunk in resp.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+                tail = (tail + chunk)[-_TAIL_SIZE:]
+        return tail
+
+    def fetch(self, query, path=None):
+        """Result of one query (with path: the answer saved there, path is returned),
+        or None once all attempts failed."""
+        for attempt in range(self.attempts):
+            url, wait = self._pick_mirror()
+            if wait > 0:
+                self.sleep(wait)
+
+            data, error, retry_after, retryable = self._request(url, query, path)
+            if data is not None:
+                return data
+
+            with self._lock:
+                self.failures += 1
+            if not retryable:
+                print(f"⚠️ Overpass-Anfrage abgelehnt ({url}): {error}")
+                _discard(path)
+                return None
+
+            delay = retry_after if retry_after is not None else min(self.max_backoff, self.backoff * 2 ** attempt)
+            self._block(url, delay)
+            if attempt + 1 < self.attempts:
+                print(f"⚠️ API-Versuch {attempt+1} fehlgeschlagen ({url}): {error} - Pause {delay:.0f}s")
+            else:
+                print(f"⚠️ API-Versuch {attempt+1} fehlgeschlagen ({url}): {error}")
+        _discard(path)
+        return None
+
+    def fetch_all(self, queries, paths=None):
+        """Results of all queries (None for failed ones), in the order given."""
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=self.slots) as pool:
+            return list(pool.map(self.fetch, queries, paths or [None] * len(queries)))
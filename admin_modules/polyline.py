@@ -0,0 +1,127 @@
+"""Compact geometry format 'polyline6' for plan files.
+
+Coordinates are stored as 1e-6 fixed-point integers, delta-encoded and
+packed with the encoded polyline algorithm (as used by Google/OSRM):
+  path     -> list of strings, one per line
+  path_lod -> {level: list of strings}, see admin_modules/simplify.py
+  houses   -> one string of (lat, lon, w) triples, w is not delta-encoded
+The decoder for the browser lives in templates/index.html (decodePolyline).
+"""
+
+FORMAT = 'polyline6'
+PRECISION = 1e6
+
+
+def _encode_value(v, out):
+    v = ~(v << 1) if v < 0 else v << 1
+    while v >= 0x20:
+        out.append(chr((0x20 | (v & 0x1f)) + 63))
+        v >>= 5
+    out.append(chr(v + 63))
+
+
+def _decode_values(s):
+    values, i, n = [], 0, len(s)
+    while i < n:
+        result, shift = 0, 0
+        while True:
+            b = ord(s[i]) - 63
+            i += 1
+            result |= (b & 0x1f) << shift
+            shift += 5
+            if b < 0x20:
+                break
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+    return values
+
+
+def encode_line(points):
+    """[[lat, lon], ...] -> str"""
+    out, plat, plon = [], 0, 0
+    for p in points:
+        lat, lon = round(p[0] * PRECISION), round(p[1] * PRECISION)
+        _encode_value(lat - plat, out)
+        _encode_value(lon - plon, out)
+        plat, plon = lat, lon
+    return ''.join(out)
+
+
+def decode_line(s):
+    """str -> [[lat, lon], ...]"""
+    vals = _decode_values(s)
+    points, lat, lon = [], 0, 0
+    for i in range(0, len(vals) - 1, 2):
+        lat += vals[i]
+        lon += vals[i + 1]
+        points.append([lat / PRECISION, lon / PRECISION])
+    return points
+
+
+def encode_houses(houses):
+    """[{lat, lon, w}, ...] -> str"""
+    out, plat, plon = [], 0, 0
+    for h in houses:
+        lat, lon = round(h['lat'] * PRECISION), round(h['lon'] * PRECISION)
+        _encode_value(lat - plat, out)
+        _encode_value(lon - plon, out)
+        _encode_value(int(h.get('w', 1)), out)
+        plat, plon = lat, lon
+    return ''.join(out)
+
+
+def decode_houses(s):
+    """str -> [{lat, lon, w}, ...]"""
+    vals = _decode_values(s)
+    houses, lat, lon = [], 0, 0
+    for i in range(0, len(vals) - 2, 3):
+        lat += vals[i]
+        lon += vals[i + 1]
+        houses.append({'lat': lat / PRECISION, 'lon': lon / PRECISION, 'w': vals[i + 2]})
+    return houses
+
+
+def encode_street(s):
+    """Returns a copy of the street with path/houses encoded."""
+    enc = dict(s)
+    if isinstance(s.get('path'), list):
+        enc['path'] = [encode_line(line) for line in s['path']]
+    if s.get('path_lod'):
+        enc['path_lod'] = {z: [encode_line(line) for line in lines] for z, lines in s['path_lod'].items()}
+    if isinstance(s.get('houses'), list):
+        enc['houses'] = encode_houses(s['houses'])
+    return enc
+
+
+def decode_street(s):
+    """Decodes path/houses of a street in place."""
+    if s.get('path') and isinstance(s['path'][0], str):
+        s['path'] = [decode_line(line) for line in s['path']]
+    for z, lines in (s.get('path_lod') or {}).items():
+        if lines and isinstance(lines[0], str):
+            s['path_lod'][z] = [decode_line(line) for line in lines]
+    if isinstance(s.get('houses'), str):
+        s['houses'] = decode_houses(s['houses'])
+    return s
+
+
+def is_compact(data):
+    return data.get('metadata', {}).get('geometry_format') == FORMAT
+
+
+def encode_plan(data):
+    """Returns a copy of a plan document with all geometry in polyline6 (marked in metadata)."""
+    meta = dict(data.get('metadata', {}))
+    meta['geometry_format'] = FORMAT
+    return {
+        **data,
+        'metadata': meta,
+        'streets': {s_id: encode_street(s) for s_id, s in data.get('streets', {}).items()}
+    }
+
+
+def decode_plan(data):
+    """Decodes a polyline6 plan in place (no-op for plain plans). The format flag is kept."""
+    if is_compact(data):
+        for s in data.get('streets', {}).values():
+            decode_street(s)
+    return data
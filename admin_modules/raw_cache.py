@@ -0,0 +1,230 @@
+"""Raw Overpass responses on disk, one gzip file per PLZ and query kind.
+
+  cache/raw_<plz>_<kind>.json.gz = {"fetched": unix time,
+                                    "osm_base": OSM timestamp of the answer,
+                                    "data": Overpass JSON}
+
+Entries expire after CACHE_TTL_DAYS; an expired entry is then brought up
+to date with only what changed in OSM since osm_base (see
+overpass.refresh_query). The directory is kept below
+CACHE_MAX_MB by deleting the least recently used entries (file mtime is
+bumped on every hit). Old combined caches (raw_<plz>_<plz>.json) take
+part in the eviction but are not read anymore.
+
+"fetched" and "osm_base" come first, so they are read from the head of
+the file; the elements are streamed (see stream_json.py) and an answer
+can be written to the cache without ever being parsed (put_file) or
+element by element (put_elements).
+"""
+
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+
+from .stream_json import iter_elements
+
+try:
+    import config
+except ImportError:
+    config = None
+
+KINDS = ('streets', 'houses')
+
+_HEAD_SIZE = 64 * 1024
+_FETCHED_RE = re.compile(r'"fetched"\s*:\s*([0-9.]+)')
+_OSM_BASE_RE = re.compile(r'"(?:osm_base|timestamp_osm_base)"\s*:\s*"([^"]+)"')
+
+
+class RawCache:
+    def __init__(self, cache_dir="cache", ttl_days=None, max_mb=None):
+        self.cache_dir = cache_dir
+        if ttl_days is None:
+            ttl_days = getattr(config, 'CACHE_TTL_DAYS', 30) if config else 30
+        if max_mb is None:
+            max_mb = getattr(config, 'CACHE_MAX_MB', 500) if config else 500
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_bytes = max_mb * 1024 * 1024 if max_mb else None
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, plz, kind):
+        return os.path.join(self.cache_dir, f"raw_{plz}_{kind}.json.gz")
+
+    def load_entry(self, plz, kind):
+        """The whole entry (incl. fetched/osm_base) regardless of age, or None."""
+        try:
+            with gzip.open(self.path(plz, kind), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Defekter Cache-Eintrag {self.path(plz, kind)}: {e}")
+            return None
+
+    def meta(self, plz, kind):
+        """{"fetched", "osm_base"} of an entry, read from its head, or None."""
+        try:
+            with gzip.open(self.path(plz, kind), 'rt', encoding='utf-8') as f:
+                head = f.read(_HEAD_SIZE)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            print(f"⚠️ Defekter Cache-Eintrag {self.path(plz, kind)}: {e}")
+            return None
+        fetched = _FETCHED_RE.search(head)
+        osm_base = _OSM_BASE_RE.search(head)
+        return {"fetched": float(fetched.group(1)) if fetched else 0,
+                "osm_base": osm_base.group(1) if osm_base else None}
+
+    def fresh(self, plz, kind):
+        """True if there is an entry that has not expired yet (counted as hit/miss)."""
+        meta = self.meta(plz, kind)
+        if meta is None:
+            self.misses += 1
+            return False
+        if self.ttl and time.time() - meta['fetched'] > self.ttl:
+            self.expired += 1
+            self.misses += 1
+            return False
+        self.hits += 1
+        try:
+            os.utime(self.path(plz, kind))  # LRU
+        except OSError:
+            pass
+        return True
+
+    def elements(self, plz, kind):
+        """Streams the elements of an entry."""
+        with gzip.open(self.path(plz, kind), 'rt', encoding='utf-8') as f:
+            yield from iter_elements(f)
+
+    def put(self, plz, kind, data, fetched=None):
+        entry = {
+            "fetched": fetched or time.time(),
+            "osm_base": (data.get('osm3s') or {}).get('timestamp_osm_base'),
+            "data": data
+        }
+        path = self.path(plz, kind)
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def download_path(self, plz, kind):
+        """Where a raw answer is downloaded to before put_file()."""
+        return self.path(plz, kind) + '.download.tmp'
+
+    def discard_download(self, plz, kind):
+        """Removes a download that did not become an entry (entries() and evict() never see it)."""
+        try:
+            os.remove(self.download_path(plz, kind))
+        except FileNotFoundError:
+            pass
+
+    def _entry_head(self, fetched, osm_base):
+        return '{"fetched":%s,"osm_base":%s,"data":' % (json.dumps(fetched or time.time()), json.dumps(osm_base))
+
+    def put_file(self, plz, kind, body_path, fetched=None):
+        """Stores the raw Overpass answer in body_path as entry, without parsing it; removes body_path."""
+        with open(body_path, 'r', encoding='utf-8') as body:
+            head = body.read(_HEAD_SIZE)
+            osm_base = _OSM_BASE_RE.search(head)
+            path = self.path(plz, kind)
+            tmp = path + '.tmp'
+            try:
+                with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+                    f.write(self._entry_head(fetched, osm_base.group(1) if osm_base else None))
+                    f.write(head)
+                    shutil.copyfileobj(body, f)
+                    f.write('}')
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        os.replace(tmp, path)
+        os.remove(body_path)
+        self.evict(keep=path)
+
+    def put_elements(self, plz, kind, elements, body_path, fetched=None):
+        """Stores the elements (any iterable, written one by one) as entry, with the OSM
+        timestamp of the answer in body_path; removes body_path. Returns the JSON size in bytes."""
+        with open(body_path, 'r', encoding='utf-8') as body:
+            osm_base = _OSM_BASE_RE.search(body.read(_HEAD_SIZE))
+        osm_base = osm_base.group(1) if osm_base else None
+        path = self.path(plz, kind)
+        tmp = path + '.tmp'
+        size = 0
+        try:
+            with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+                size += f.write(self._entry_head(fetched, osm_base))
+                size += f.write('{"osm3s":{"timestamp_osm_base":%s},"elements":[' % json.dumps(osm_base))
+                sep = ''
+                for el in elements:
+                    size += f.write(sep + json.dumps(el, separators=(',', ':')))
+                    sep = ','
+                size += f.write(']}}')
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, path)
+        os.remove(body_path)
+        self.evict(keep=path)
+        return size
+
+    def entries(self):
+        """[(path, size, mtime)] of all raw cache files, least recently used first."""
+        res = []
+        for path in glob.glob(os.path.join(self.cache_dir, "raw_*")):
+            if path.endswith('.tmp'):
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            res.append((path, st.st_size, st.st_mtime))
+        return sorted(res, key=lambda e: e[2])
+
+    def cached_plz(self):
+        """PLZ with at least one entry, sorted."""
+        found = set()
+        for path, _, _ in self.entries():
+            name = os.path.basename(path)
+            for kind in KINDS:
+                suffix = f"_{kind}.json.gz"
+                if name.endswith(suffix):
+                    found.add(name[len("raw_"):-len(suffix)])
+        return sorted(found)
+
+    def evict(self, keep=None):
+        """Deletes least recently used entries until the directory fits into max_mb."""
+        if not self.max_bytes:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evicted += 1
+
+    def report(self):
+        """One line for the admin CLI."""
+        return (f"📦 Cache: {self.hits} Treffer, {self.misses} fehlend"
+                f"{f' (davon {self.expired} abgelaufen)' if self.expired else ''}"
+                f"{f', {self.evicted} verdrängt' if self.evicted else ''}")
@@ -0,0 +1,85 @@
+"""Levels of detail for street geometry (Douglas-Peucker).
+
+A plan street keeps its full geometry in 'path'. process_streets() adds
+'path_lod' = {max_zoom: lines}: simplified copies for the map at low zoom
+levels. The key is the highest zoom level a copy is meant for (as string,
+it is a JSON object key). Exports always use the full 'path'.
+"""
+
+import math
+
+# (max zoom, tolerance in metres). At zoom 13 a pixel is ~12m in Germany,
+# at zoom 15 ~3m - half a pixel of error is invisible.
+LOD_LEVELS = [(13, 6.0), (15, 1.5)]
+
+LOD_FIELD = 'path_lod'
+
+_M_PER_DEG = 111320.0
+
+
+def simplify_line(points, tolerance_m):
+    """Douglas-Peucker on [[lat, lon], ...] with a tolerance in metres. Keeps both ends."""
+    n = len(points)
+    if n < 3:
+        return [list(p) for p in points]
+
+    # Local equirectangular projection is accurate enough for one street
+    kx = _M_PER_DEG * math.cos(math.radians(points[0][0]))
+    xy = [(p[1] * kx, p[0] * _M_PER_DEG) for p in points]
+    tol2 = tolerance_m * tolerance_m
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xy[first]
+        bx, by = xy[last]
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+
+        max_d2, index = -1.0, None
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            if seg2 == 0:
+                d2 = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+                d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 > max_d2:
+                max_d2, index = d2, i
+
+        if index is not None and max_d2 > tol2:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [list(points[i]) for i in range(n) if keep[i]]
+
+
+def build_lod(lines, levels=LOD_LEVELS):
+    """Simplified copies of a street's lines, {str(max_zoom): lines}.
+
+    A level that does not drop any points compared to the next finer one
+    is left out - pick_lod() then falls through to the finer geometry.
+    """
+    lod = {}
+    finer_count = sum(len(line) for line in lines)
+    for zoom, tol in sorted(levels, key=lambda l: -l[0]):
+        simplified = [simplify_line(line, tol) for line in lines]
+        count = sum(len(line) for line in simplified)
+        if count < finer_count:
+            lod[str(zoom)] = simplified
+            finer_count = count
+    return lod
+
+
+def pick_lod(street, zoom):
+    """Returns (lines, level) for a map at 'zoom'; level None means full detail."""
+    lod = street.get(LOD_FIELD)
+    if lod and zoom is not None:
+        fitting = [int(z) for z in lod if int(z) >= zoom]
+        if fitting:
+            level = str(min(fitting))
+            return lod[level], level
+    return street.get('path', []), None
@@ -0,0 +1,198 @@
+import math
+
+
+def path_bbox(lines):
+    """Bounding box [min_lat, min_lon, max_lat, max_lon] of a list of lines, or None."""
+    lats = [p[0] for line in lines for p in line]
+    lons = [p[1] for line in lines for p in line]
+    if not lats:
+        return None
+    return [min(lats), min(lons), max(lats), max(lons)]
+
+
+def bboxes_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class GridIndex:
+    """Uniform grid over bounding boxes (lat/lon degrees).
+
+    Every item is registered in each cell its bbox touches, so a query only
+    looks at the cells of the query box. Cell size should be in the order
+    of the typical item (or query) size.
+    """
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bboxes = {}
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _cell_range(self, bbox):
+        c0 = self._cell(bbox[0], bbox[1])
+        c1 = self._cell(bbox[2], bbox[3])
+        return c0, c1
+
+    def insert(self, key, bbox):
+        self.bboxes[key] = bbox
+        (i0, j0), (i1, j1) = self._cell_range(bbox)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), []).append(key)
+
+    def query(self, bbox):
+        """Keys of all items whose bbox intersects 'bbox'."""
+        (i0, j0), (i1, j1) = self._cell_range(bbox)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            # Query larger than the populated area: walk the cells we have
+            cells = [v for (i, j), v in self.cells.items() if i0 <= i <= i1 and j0 <= j <= j1]
+        else:
+            cells = [self.cells[(i, j)] for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)
+                     if (i, j) in self.cells]
+
+        found = set()
+        for keys in cells:
+            for key in keys:
+                if key not in found and bboxes_intersect(self.bboxes[key], bbox):
+                    found.add(key)
+        return found
+
+    def __len__(self):
+        return len(self.bboxes)
+
+
+M_PER_DEG = 111320.0
+
+
+class LocalProjection:
+    """Equirectangular projection around a reference point, in metres.
+
+    Accurate to well below a metre over a few kilometres - plenty for
+    house-to-street distances within one campaign area.
+    """
+
+    def __init__(self, lat0, lon0=0.0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.kx = M_PER_DEG * math.cos(math.radians(lat0))
+        self.ky = M_PER_DEG
+
+    def __call__(self, lat, lon):
+        return ((lon - self.lon0) * self.kx, (lat - self.lat0) * self.ky)
+
+
+def point_segment_dist2(px, py, ax, ay, bx, by):
+    """Squared distance from point p to the segment a-b (projected coordinates)."""
+    dx, dy = bx - ax, by - ay
+    seg2 = dx * dx + dy * dy
+    if seg2 == 0:
+        t = 0.0
+    else:
+        t = ((px - ax) * dx + (py - ay) * dy) / seg2
+        t = 0.0 if t < 0.0 else (1.0 if t > 1.0 else t)
+    ex, ey = px - (ax + t * dx), py - (ay + t * dy)
+    return ex * ex + ey * ey
+
+
+class SegmentIndex:
+    """Uniform grid over line segments in projected (metre) coordinates.
+
+    Segments are numbered in insertion order; nearest() breaks ties by the
+    lower number, so results do not depend on cell iteration order.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.segments = []   # (ax, ay, bx, by)
+        self.keys = []       # key per segment
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def add(self, key, ax, ay, bx, by):
+        idx = len(self.segments)
+        self.segments.append((ax, ay, bx, by))
+        self.keys.append(key)
+        i0, j0 = self._cell(min(ax, bx), min(ay, by))
+        i1, j1 = self._cell(max(ax, bx), max(ay, by))
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), []).append(idx)
+
+    def add_lines(self, key, lines):
+        """Adds all segments of [[(x, y), ...], ...]; single points become zero-length segments."""
+        for line in lines:
+            if len(line) == 1:
+                self.add(key, line[0][0], line[0][1], line[0][0], line[0][1])
+            for a, b in zip(line, line[1:]):
+                self.add(key, a[0], a[1], b[0], b[1])
+
+    def candidates(self, x, y, max_dist):
+        """Segment numbers whose cells lie within max_dist of the point."""
+        i0, j0 = self._cell(x - max_dist, y - max_dist)
+        i1, j1 = self._cell(x + max_dist, y + max_dist)
+        found = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                found.update(self.cells.get((i, j), ()))
+        return found
+
+    def nearest(self, x, y, max_dist=None):
+        """(key, distance) of the closest segment within max_dist (None: any), or (None, None)."""
+        if max_dist is None:
+            best_d2, candidates = float('inf'), range(len(self.segments))
+        else:
+            best_d2, candidates = max_dist * max_dist, self.candidates(x, y, max_dist)
+        best_idx = None
+        for idx in candidates:
+            ax, ay, bx, by = self.segments[idx]
+            d2 = point_segment_dist2(x, y, ax, ay, bx, by)
+            if d2 < best_d2 or (d2 == best_d2 and best_idx is not None and idx < best_idx):
+                best_d2, best_idx = d2, idx
+        if best_idx is None:
+            return None, None
+        return self.keys[best_idx], math.sqrt(best_d2)
+
+    def __len__(self):
+        return len(self.segments)
+
+
+class PolygonIndex:
+    """Point-in-polygon test (even-odd rule) for lat/lon edges [((lat, lon), (lat, lon)), ...].
+
+    The edges only have to form closed rings as a whole, in any order and
+    direction, so the member ways of a boundary relation can be used as
+    they are and inner rings (holes) need no special handling. Edges are
+    bucketed into latitude bands; a test only looks at its own band.
+    """
+
+    def __init__(self, edges, bands=256):
+        self.edges = edges
+        self.bbox = path_bbox([[a, b] for a, b in edges])
+        self.bands = [[] for _ in range(bands)]
+        if self.bbox:
+            self.lat0 = self.bbox[0]
+            self.band_h = (self.bbox[2] - self.bbox[0]) / bands or 1.0
+            for k, (a, b) in enumerate(edges):
+                for band in range(self._band(min(a[0], b[0])), self._band(max(a[0], b[0])) + 1):
+                    self.bands[band].append(k)
+
+    def _band(self, lat):
+        return min(len(self.bands) - 1, max(0, int((lat - self.lat0) / self.band_h)))
+
+    def in_bbox(self, lat, lon):
+        b = self.bbox
+        return bool(b) and b[0] <= lat <= b[2] and b[1] <= lon <= b[3]
+
+    def contains(self, lat, lon):
+        if not self.in_bbox(lat, lon):
+            return False
+        inside = False
+        for k in self.bands[self._band(lat)]:
+            (lat1, lon1), (lat2, lon2) = self.edges[k]
+            if (lat1 > lat) != (lat2 > lat) and lon < lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1):
+                inside = not inside
+        return inside
@@ -0,0 +1,115 @@
+"""Splitting long streets into parts that can be walked in one go.
+
+The ways of a street are chained along shared end nodes into runs: a run
+follows the street from a dead end (or junction) as far as it goes and
+turns every way in walking direction. Runs are concatenated, each starting
+close to where the previous one ended. The parts are then contiguous cuts
+of that order, balanced over length and households, and cut where one run
+ends and the next begins if that is close to the balanced position.
+
+The households per way come from the house assignment (the nearest way of
+every house is known from it), so houses are not searched again per part.
+"""
+
+import math
+
+from .geo import haversine
+
+# A cut moves to the end of a run if that is within this share of a part's budget
+RUN_BREAK_SLACK = 0.25
+
+
+def _node(p):
+    return (round(p[0], 7), round(p[1], 7))
+
+
+def way_length(path):
+    return sum(haversine(a[0], a[1], b[0], b[1]) for a, b in zip(path, path[1:]))
+
+
+def chain_ways(paths):
+    """Walking order of the ways: [(way index, reversed), ...] and the positions where a new run starts."""
+    at_node = {}
+    for i, p in enumerate(paths):
+        at_node.setdefault(_node(p[0]), []).append(i)
+        at_node.setdefault(_node(p[-1]), []).append(i)
+
+    def degree(node):
+        return len(at_node[node])
+
+    used = [False] * len(paths)
+    order, run_starts = [], []
+    position = None
+    while len(order) < len(paths):
+        # Start a run at a free end: a dead end if there is one, closest to where the last run ended
+        free = [i for i in range(len(paths)) if not used[i]]
+        starts = [(i, rev) for i in free for rev in (False, True)]
+
+        def start_key(c):
+            i, rev = c
+            p = paths[i][-1] if rev else paths[i][0]
+            even = degree(_node(p)) % 2 == 0
+            gap = haversine(position[0], position[1], p[0], p[1]) if position else 0.0
+            return (even, gap, i, rev)
+
+        i, rev = min(starts, key=start_key)
+        run_starts.append(len(order))
+        while True:
+            used[i] = True
+            order.append((i, rev))
+            end = paths[i][0] if rev else paths[i][-1]
+            node = _node(end)
+            position = end
+            nxt = [j for j in at_node[node] if not used[j]]
+            if not nxt:
+                break
+            i = min(nxt)
+            rev = _node(paths[i][0]) != node
+    return order, run_starts
+
+
+def split_ways(paths, way_households, parts):
+    """Splits the ways into 'parts' contiguous groups of the chained order.
+
+    Returns [[(way index, reversed), ...], ...] with balanced length and
+    households (way_households: households per way).
+    """
+    order, run_starts = chain_ways(paths)
+    parts = max(1, min(parts, len(order)))
+    lengths = [way_length(paths[i]) for i, _ in order]
+    weights = [way_households[i] for i, _ in order]
+    total_len, total_hh = sum(lengths), sum(weights)
+
+    # Each way costs its share of the length and of the households
+    cost = []
+    for length, hh in zip(lengths, weights):
+        c = length / total_len if total_len else 1.0 / len(order)
+        if total_hh:
+            c = (c + hh / total_hh) / 2
+        cost.append(c)
+    cum = [0.0]
+    for c in cost:
+        cum.append(cum[-1] + c)
+
+    breaks = set(run_starts) - {0}
+    budget = cum[-1] / parts
+    cuts = [0]
+    for k in range(1, parts):
+        target = cum[-1] * k / parts
+        lo, hi = cuts[-1] + 1, len(order) - (parts - k)
+        best = min(range(lo, hi + 1), key=lambda j: (abs(cum[j] - target), j))
+        near_breaks = [j for j in breaks if lo <= j <= hi and abs(cum[j] - target) <= RUN_BREAK_SLACK * budget]
+        if near_breaks:
+            best = min(near_breaks, key=lambda j: (abs(cum[j] - target), j))
+        cuts.append(best)
+    cuts.append(len(order))
+    return [order[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def orient(path, rev):
+    return path[::-1] if rev else path
+
+
+def part_count(length_m):
+    """Number of parts for a street that has to be split (one per ~400 m, at least two)."""
+    return max(2, math.floor(length_m / 400))
@@ -0,0 +1,73 @@
+"""Element-by-element parsing of Overpass JSON.
+
+An 'out geom' answer for a district is hundreds of MB; json.load() would
+hold the text and every element dict at once. iter_elements() reads the
+file in chunks and decodes one element of the "elements" array at a time
+(json.JSONDecoder.raw_decode), so only the current chunk and whatever
+the consumer keeps stay in memory.
+"""
+
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+
+_ELEMENTS_RE = re.compile(r'"elements"\s*:\s*\[')
+_SKIP = ' \t\r\n,'
+
+
+def iter_elements(f, chunk_size=CHUNK_SIZE):
+    """Yields the elements of the first "elements" array in the text file f."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    while True:
+        m = _ELEMENTS_RE.search(buf)
+        if m:
+            pos = m.end()
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        buf += chunk
+
+    while True:
+        while pos < len(buf) and buf[pos] in _SKIP:
+            pos += 1
+        if pos == len(buf):
+            buf, pos = f.read(chunk_size), 0
+            if not buf:
+                raise ValueError("Unvollständige Overpass-Antwort")
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            el, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Element continues in the next chunk
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield el
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+class ElementStream:
+    """Elements of several sources (callables returning an element iterator), each
+    (type, id) once. Can be iterated repeatedly; every pass re-reads the sources."""
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+
+    def __iter__(self):
+        seen = set()
+        for source in self.sources:
+            for el in source():
+                key = (el.get('type'), el.get('id'))
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield el
@@ -0,0 +1,105 @@
+"""Parallel plan building for large areas (several PLZ up to a Landkreis).
+
+House assignment is split into square tiles. A worker gets the houses of
+its tile plus every street line within a halo of one radius around it,
+so it finds exactly what a single global run would. Lines keep their
+global order and all workers share one projection, so distances and tie
+breaks match the global result bit for bit. Per-street post-processing
+(splitting, levels of detail) is independent per street and is mapped
+over the pool in chunks.
+
+Results are merged in input order, never in completion order, so a
+parallel build is identical to a sequential one.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .assign import MIN_CELL_M, make_projection, nearest_in_index
+from .spatial import SegmentIndex
+
+try:
+    import config
+except ImportError:
+    config = None
+
+# Edge length of an assignment tile
+TILE_SIZE_M = 2000.0
+
+# Below this the pool costs more than it saves
+PARALLEL_MIN_HOUSES = 5000
+PARALLEL_MIN_STREETS = 1000
+
+
+def build_workers():
+    """Number of worker processes (config BUILD_WORKERS, default: all cores)."""
+    workers = getattr(config, 'BUILD_WORKERS', None) if config else None
+    return workers or os.cpu_count() or 1
+
+
+def _tile_task(task):
+    cell_size, lines, xy, radius_m = task
+    index = SegmentIndex(cell_size)
+    for s_id, line in lines:
+        index.add_lines(s_id, [line])
+    return nearest_in_index(index, xy, radius_m)
+
+
+def nearest_streets_tiled(street_paths, points, radius_m, workers=None, tile_m=TILE_SIZE_M):
+    """Same result as assign.nearest_streets(), computed tile by tile in a process pool."""
+    if not points:
+        return []
+    workers = workers or build_workers()
+    proj = make_projection(street_paths)
+    xy = [proj(lat, lon) for lat, lon in points]
+
+    def tile_of(x, y):
+        return (math.floor(x / tile_m), math.floor(y / tile_m))
+
+    tiles = {}
+    for i, (x, y) in enumerate(xy):
+        tiles.setdefault(tile_of(x, y), []).append(i)
+
+    # Every line goes to each tile whose halo its bbox touches (in global order)
+    tile_lines = {key: [] for key in tiles}
+    for s_id, paths in street_paths.items():
+        for line in paths:
+            pts = [proj(p[0], p[1]) for p in line]
+            if not pts:
+                continue
+            xs, ys = [p[0] for p in pts], [p[1] for p in pts]
+            i0, j0 = tile_of(min(xs) - radius_m, min(ys) - radius_m)
+            i1, j1 = tile_of(max(xs) + radius_m, max(ys) + radius_m)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    if (i, j) in tile_lines:
+                        tile_lines[(i, j)].append((s_id, pts))
+
+    keys = sorted(tiles)
+    cell_size = max(radius_m, MIN_CELL_M)
+    tasks = [(cell_size, tile_lines[k], [xy[i] for i in tiles[k]], radius_m) for k in keys]
+
+    result = [None] * len(points)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for key, found in zip(keys, pool.map(_tile_task, tasks)):
+            for i, res in zip(tiles[key], found):
+                result[i] = res
+    return result
+
+
+def _map_chunk(task):
+    func, items = task
+    return [func(*item) for item in items]
+
+
+def map_streets(func, raw_streets, workers=None, chunk=200):
+    """[func(s_id, data) for every street] in a process pool, results in street order."""
+    workers = workers or build_workers()
+    items = list(raw_streets.items())
+    tasks = [(func, items[i:i + chunk]) for i in range(0, len(items), chunk)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_map_chunk, tasks):
+            results.extend(part)
+    return results
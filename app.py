@@ -1,10 +1,19 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 import json
 import os
 import subprocess
 from datetime import datetime, timedelta
 import requests
 import math
+import time
+from app_modules.state import open_store
+from app_modules.writer import GroupCommitWriter
+from app_modules.payloads import GeometryCache, NeighborGraph, StreetIndex, build_status, build_summary, publish_geometry
+from app_modules.artifacts import ARTIFACT_DIR, pick_encoding
+from app_modules.route import MAX_SEGMENTS, plan_route, to_gpx
+from admin_modules.polyline import decode_plan
+from admin_modules.house_index import HouseIndexFile, house_index_path
+from admin_modules.districts import DISTRICT_FIELD, assign_districts
 try:
     import config
 except ImportError:
@@ -13,13 +22,33 @@ except ImportError:
 app = Flask(__name__)
 DATA_FILE = 'data/streets_status.json'
 
+# Parsed state is shared by all requests of this worker and only re-read
+# when it changes on disk (see app_modules/state.py). STATE_BACKEND selects
+# the JSON file + journal ('json', default) or SQLite ('sqlite').
+store = open_store(
+    DATA_FILE,
+    backend=getattr(config, 'STATE_BACKEND', 'json') if config else 'json',
+    compact_interval=getattr(config, 'JOURNAL_COMPACT_SECONDS', 60) if config else 60,
+    db_path=getattr(config, 'STATE_DB', None) if config else None
+)
+# All /update calls of this worker are batched into one journal record per lock round.
+writer = GroupCommitWriter(store, window=(getattr(config, 'UPDATE_BATCH_WINDOW_MS', 0) if config else 0) / 1000.0)
+
+# Serialized plan geometry, rebuilt only when the plan itself changes
+geometry_cache = GeometryCache(store, artifact_dir=ARTIFACT_DIR)
+# Grid over street bounding boxes for /api/streets?bbox=...
+street_index = StreetIndex(store)
+# Street adjacency for "Angrenzend" / proximity sorting
+neighbor_graph = NeighborGraph(store)
+# All address points of the plan area (written by admin.py) for /admin/count_houses
+house_index = HouseIndexFile(house_index_path(DATA_FILE))
+
 def load_data():
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # Note: returns the cached document - mutate only if you call save_data() afterwards
+    return store.get()
 
 def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, sort_keys=True, ensure_ascii=False)
+    store.save(data)
 
 import shutil
 
@@ -40,14 +69,24 @@ def publish_staging():
         
     # Promote Staging to Live
     if os.path.exists('data/staging.json'):
-        # Backup old live
+        # Backup old live (incl. pending status changes)
         if os.path.exists(DATA_FILE):
+             store.compact()
              ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
              backup_path = f"data/backups/pre_publish_{ts}.json"
              os.makedirs('data/backups', exist_ok=True)
              shutil.copy2(DATA_FILE, backup_path)
              
         shutil.copy2('data/staging.json', DATA_FILE)
+        if os.path.exists(house_index_path('data/staging.json')):
+            shutil.move(house_index_path('data/staging.json'), house_index_path(DATA_FILE))
+        
+        # Precompressed geometry for /api/geometry
+        artifacts = []
+        try:
+            artifacts = publish_geometry(DATA_FILE)
+        except (OSError, ValueError) as e:
+            print(f"Artifact Error during Publish: {e}")
         
         # Cleanup Local Files
         try:
@@ -58,8 +97,9 @@ def publish_staging():
             
         # --- GIT OPERATIONS ---
         try:
-            # 1. Stage the new Live file
-            subprocess.run(["git", "add", DATA_FILE], check=True)
+            # 1. Stage the new Live file (and its precompressed geometry)
+            extra = [house_index_path(DATA_FILE)] if os.path.exists(house_index_path(DATA_FILE)) else []
+            subprocess.run(["git", "add", DATA_FILE] + artifacts + extra, check=True)
             
             # 2. Stage the deletion of Staging files (if tracked)
             # Use 'git rm --cached' or just 'git rm' if they exist, but we deleted them physically above.
@@ -99,7 +139,7 @@ def preview(uuid):
         return "Error: Staging data missing", 500
         
     with open('data/staging.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
+        data = decode_plan(json.load(f))
         
     # Inject Preview Flags
     days = data.get('metadata', {}).get('duration', 7)
@@ -140,47 +180,226 @@ def index():
         except (ValueError, IndexError):
              pass 
 
-    return render_template('index.html', metadata=data['metadata'], streets=data['streets'], survey_days=days)
+    # Geometry and status are loaded by the page via /api/geometry and /api/status
+    _, etag = geometry_cache.get()
+    live_updates = getattr(config, 'LIVE_UPDATES', 'poll') if config else 'poll'
+    # Large plans (several PLZ) only load the geometry of the visible map area
+    viewport_min = getattr(config, 'VIEWPORT_MODE_MIN_STREETS', 1500) if config else 1500
+    viewport_mode = viewport_min is not None and len(data.get('streets', {})) > viewport_min
+    return render_template('index.html', metadata=data['metadata'], geometry_url=f"/api/geometry?v={etag}",
+                           plan_etag=etag, viewport_mode=viewport_mode, live_updates=live_updates,
+                           survey_days=days)
+
+@app.route('/api/geometry', methods=['GET'])
+def api_geometry():
+    try:
+        variants, etag = geometry_cache.variants()
+    except FileNotFoundError:
+        return jsonify({"streets": {}}), 404
+
+    # Precompressed at publish time (see app_modules/artifacts.py)
+    encoding = pick_encoding(variants, request.accept_encodings)
+    resp = Response(variants[encoding], mimetype='application/json')
+    resp.vary.add('Accept-Encoding')
+    if encoding != 'identity':
+        resp.content_encoding = encoding
+        resp.set_etag(f"{etag}-{encoding}")
+    else:
+        resp.set_etag(etag)
+
+    if request.args.get('v') == etag:
+        # Versioned URL from the page: content for this etag never changes
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 31536000
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@app.route('/api/streets', methods=['GET'])
+def api_streets():
+    """Streets of a map viewport: ?bbox=minlat,minlon,maxlat,maxlon&zoom=z.
+
+    Without bbox the geometry-free summary (name, households, length,
+    coords) of all streets is returned.
+    """
+    try:
+        _, etag = geometry_cache.get()
+    except FileNotFoundError:
+        return jsonify({"streets": {}}), 404
+
+    bbox = request.args.get('bbox')
+    if bbox is not None:
+        try:
+            bbox = [float(x) for x in bbox.split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify({"success": False, "msg": "bbox=minlat,minlon,maxlat,maxlon erwartet"}), 400
+        payload = street_index.query(bbox, zoom=request.args.get('zoom', type=int))
+    else:
+        payload = build_summary(load_data())
+    payload["plan"] = etag
+
+    # Like /api/geometry, the answer only depends on the plan and the query
+    resp = jsonify(payload)
+    resp.add_etag()
+    if request.args.get('v') == etag:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 31536000
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@app.route('/api/neighbors', methods=['GET'])
+def api_neighbors():
+    """Street adjacency {id: [[neighbor id, distance in m], ...]}, nearest first."""
+    try:
+        _, etag = geometry_cache.get()
+    except FileNotFoundError:
+        return jsonify({"neighbors": {}}), 404
+
+    resp = jsonify({"neighbors": neighbor_graph.get(), "plan": etag})
+    resp.add_etag()
+    # Manual streets change the graph but not the geometry etag, so no immutable caching here
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+@app.route('/api/route', methods=['POST'])
+def api_route():
+    """GPX route through the given streets of one helper: {"ids": [...], "name": "..."}."""
+    req = request.json or {}
+    ids, name = req.get('ids'), req.get('name')
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids) or not isinstance(name, str):
+        return jsonify({"success": False, "msg": "Ungültige Anfrage"}), 400
+
+    streets = load_data().get('streets', {})
+    segments = []
+    for s_id in sorted(set(ids)):
+        s = streets.get(s_id)
+        # Only streets the helper has taken
+        if s is None or not name or s.get('user') != name:
+            continue
+        if s.get('path'):
+            segments.extend(list(line) for line in s['path'] if line)
+        elif s.get('coords'):
+            segments.append([s['coords']])
+    if not segments:
+        return jsonify({"success": False, "msg": "Keine Straßen gewählt"}), 400
+    if len(segments) > MAX_SEGMENTS:
+        return jsonify({"success": False, "msg": f"Zu viele Straßenabschnitte für eine Route (max. {MAX_SEGMENTS})"}), 400
+
+    ordered, stats = plan_route(segments)
+    resp = Response(to_gpx(ordered, name), mimetype='application/gpx+xml')
+    resp.headers['Content-Disposition'] = 'attachment; filename="route.gpx"'
+    resp.headers['X-Route-Gaps'] = f"{stats['gaps_m']}"
+    resp.headers['X-Route-Greedy-Gaps'] = f"{stats['greedy_m']}"
+    return resp
+
+def status_payload(since=None):
+    """Full status table, or only the streets changed after version 'since'."""
+    data = load_data()
+    _, etag = geometry_cache.get()
+    ids = store.changed_since(since) if since is not None else None
+    return build_status(data, store.version, plan=etag, ids=ids)
+
+@app.route('/api/status', methods=['GET'])
+def api_status():
+    since = request.args.get('since', type=int)
+    try:
+        payload = status_payload(since)
+    except FileNotFoundError:
+        return jsonify({"version": 0, "streets": {}}), 404
+    resp = jsonify(payload)
+    resp.cache_control.no_store = True
+    return resp
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """Server-Sent Events: pushes status deltas (needs 'gunicorn -k eventlet')."""
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    poll = getattr(config, 'SSE_POLL_SECONDS', 1) if config else 1
+    lifetime = getattr(config, 'SSE_MAX_SECONDS', 300) if config else 300
+
+    def stream(since):
+        yield "retry: 3000\n\n"
+        started = last_ping = time.time()
+        # Closed after 'lifetime', EventSource reconnects with Last-Event-ID
+        while time.time() - started < lifetime:
+            try:
+                load_data()
+                if since is None or store.version != since:
+                    payload = status_payload(since)
+                    if payload["streets"] or payload["full"]:
+                        yield f"id: {payload['version']}\nevent: status\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                    since = payload["version"]
+                    last_ping = time.time()
+            except FileNotFoundError:
+                return
+            if time.time() - last_ping > 15:
+                yield ": ping\n\n"
+                last_ping = time.time()
+            time.sleep(poll)
+
+    resp = Response(stream(since), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 @app.route('/update', methods=['POST'])
 def update():
     req = request.json
-    data = load_data()
-    # Support für einzelne ID oder Liste von IDs (Bulk)
-    ids = req['id'] if isinstance(req['id'], list) else [req['id']]
+    if 'district' in req:
+        # Ganzer Bezirk (admin_modules/districts.py) als eine Buchung
+        ids = sorted(s_id for s_id, s in load_data().get('streets', {}).items()
+                     if s.get(DISTRICT_FIELD) == req['district'])
+        if not ids:
+            return jsonify({"success": False, "msg": f"Bezirk {req['district']!r} nicht gefunden"}), 404
+    else:
+        # Support für einzelne ID oder Liste von IDs (Bulk)
+        ids = req['id'] if isinstance(req['id'], list) else [req['id']]
     
-    for s_id in ids:
-        if s_id in data['streets']:
-            current_status = data['streets'][s_id].get('status', 'free')
-            current_user = data['streets'][s_id].get('user', '')
-
-            # 1. Reservieren (nur wenn vorher frei)
-            if req['status'] == 'taken' and current_status == 'free':
-                data['streets'][s_id]['status'] = 'taken'
-                data['streets'][s_id]['user'] = req['user']
-            
-            # 2. Erledigt / In Arbeit (Statuswechsel für Eigentümer)
-            elif req['status'] in ['taken', 'done'] and current_user == req['user']:
-                data['streets'][s_id]['status'] = req['status']
-
-            # 3. Freigeben (Deselect)
-            elif req['status'] == 'free':
-                # Optional: Check if user matches or if it's an admin override (not implemented yet)
-                # For now, keep existing behavior (trust client mostly, or check user if provided)
-                if req['user'] == current_user or req['user'] == 'admin': # Simple check
-                    data['streets'][s_id]['status'] = 'free'
-                    data['streets'][s_id]['user'] = ""
-                elif not current_user: # Already free
-                     pass
-                else:
-                    # Fallback: Allow freeing if implementation relied on no-check before?
-                    # The original code was: elif req['status'] == 'free': data... = 'free'
-                    # It didn't check user. To be safe and compatible:
-                    data['streets'][s_id]['status'] = 'free'
-                    data['streets'][s_id]['user'] = ""
+    # Decided on the latest state under the writer lock, so two helpers
+    # cannot both win the same street (see app_modules/writer.py)
+    def status_changes(streets):
+        changes = {}
+        for s_id in ids:
+            if s_id in streets:
+                current_status = streets[s_id].get('status', 'free')
+                current_user = streets[s_id].get('user', '')
+
+                # 1. Reservieren (nur wenn vorher frei)
+                if req['status'] == 'taken' and current_status == 'free':
+                    changes[s_id] = {'status': 'taken', 'user': req['user']}
+                
+                # 2. Erledigt / In Arbeit (Statuswechsel für Eigentümer)
+                elif req['status'] in ['taken', 'done'] and current_user == req['user']:
+                    changes[s_id] = {'status': req['status']}
+
+                # 3. Freigeben (Deselect)
+                elif req['status'] == 'free':
+                    # Optional: Check if user matches or if it's an admin override (not implemented yet)
+                    # For now, keep existing behavior (trust client mostly, or check user if provided)
+                    if req['user'] == current_user or req['user'] == 'admin': # Simple check
+                        changes[s_id] = {'status': 'free', 'user': ""}
+                    elif not current_user: # Already free
+                         pass
+                    else:
+                        # Fallback: Allow freeing if implementation relied on no-check before?
+                        # The original code was: elif req['status'] == 'free': data... = 'free'
+                        # It didn't check user. To be safe and compatible:
+                        changes[s_id] = {'status': 'free', 'user': ""}
+        return changes
     
-    save_data(data)
-    return jsonify({"success": True})
+    won = writer.submit(status_changes)
+    return jsonify({
+        "success": True,
+        "won": [s_id for s_id in ids if s_id in won],
+        "lost": [s_id for s_id in ids if s_id not in won]
+    })
 
 @app.route('/admin/login', methods=['POST'])
 def admin_login():
@@ -259,12 +478,36 @@ def delete_street():
     
     return jsonify({"success": False, "msg": "Nicht gefunden"}), 404
 
+@app.route('/admin/partition', methods=['POST'])
+def partition_districts():
+    """Splits the plan into {"k": n} districts of similar households (0 removes them)."""
+    k = int((request.json or {}).get('k', 0))
+    data = load_data()
+    if k <= 0:
+        for s in data['streets'].values():
+            s.pop(DISTRICT_FIELD, None)
+        save_data(data)
+        return jsonify({"success": True, "districts": 0})
+
+    stats = assign_districts(data['streets'], k)
+    save_data(data)
+    return jsonify({"success": True, **stats})
+
 @app.route('/admin/count_houses', methods=['POST'])
 def count_houses():
     path = request.json.get('path', [])
     if not path or len(path) < 2:
         return jsonify({"count": 0})
 
+    # Local address points of the plan area (see admin_modules/house_index.py)
+    index = house_index.get()
+    if index is not None and index.covers(path):
+        return jsonify({"count": index.count_near(path), "source": "local"})
+
+    # Live Overpass query only if explicitly enabled (blocks the worker for up to 30s)
+    if not (config and getattr(config, 'COUNT_HOUSES_OVERPASS', False)):
+        return jsonify({"count": 0, "error": "Keine lokalen Hausdaten für dieses Gebiet"})
+
     # Build Poly string for Overpass "poly" filter
     # Format: "lat1 lon1 lat2 lon2 ..."
     poly_str = " ".join([f"{p[0]} {p[1]}" for p in path])
@@ -302,12 +545,21 @@ def count_houses():
             res = r.json()
             if 'elements' in res and len(res['elements']) > 0:
                 total = int(res['elements'][0]['tags'].get('total', 0))
-                return jsonify({"count": total})
+                return jsonify({"count": total, "source": "overpass"})
     except Exception as e:
         print(f"Overpass Error: {e}")
         
     return jsonify({"count": 0, "error": "API failed"})
 
+@app.route('/admin/state_stats', methods=['GET'])
+def state_stats():
+    stats = store.stats()
+    stats["geometry_builds"] = geometry_cache.builds
+    stats["index_builds"] = street_index.builds
+    stats["neighbor_builds"] = neighbor_graph.builds
+    stats["house_index_loads"] = house_index.loads
+    return jsonify(stats)
+
 @app.route('/admin/export_geojson', methods=['GET'])
 def export_geojson():
     data = load_data()
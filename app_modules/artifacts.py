@@ -0,0 +1,78 @@
+import glob
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ARTIFACT_DIR = 'data/artifacts'
+KEEP = 3  # geometry builds kept next to the current one
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _write(path, body):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def artifact_path(etag, out_dir=ARTIFACT_DIR):
+    return os.path.join(out_dir, f"geometry-{etag}.json")
+
+
+def write_geometry_artifacts(body, etag, out_dir=ARTIFACT_DIR):
+    """Writes a geometry payload (see payloads.build_geometry) plus .gz/.br siblings.
+
+    Files are named by their etag, so the server can tell whether the
+    precompressed files match the plan it has loaded. Returns the paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = artifact_path(etag, out_dir)
+
+    paths = [path]
+    _write(path, body)
+    # mtime=0 keeps the .gz byte-identical between builds (no git noise)
+    _write(path + '.gz', gzip.compress(body, compresslevel=9, mtime=0))
+    paths.append(path + '.gz')
+    if brotli is not None:
+        _write(path + '.br', brotli.compress(body, quality=11))
+        paths.append(path + '.br')
+
+    _prune(out_dir, etag)
+    return paths
+
+
+def _prune(out_dir, etag):
+    builds = sorted(glob.glob(os.path.join(out_dir, 'geometry-*.json')), key=os.path.getmtime, reverse=True)
+    for old in [b for b in builds if b != artifact_path(etag, out_dir)][KEEP:]:
+        for p in [old] + [old + suffix for _, suffix in ENCODINGS]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def load_geometry_variants(etag, out_dir=ARTIFACT_DIR):
+    """Returns {content_encoding: bytes} of the stored artifacts for etag ('identity' = plain)."""
+    path = artifact_path(etag, out_dir)
+    variants = {}
+    for encoding, suffix in [('identity', '')] + ENCODINGS:
+        try:
+            with open(path + suffix, 'rb') as f:
+                variants[encoding] = f.read()
+        except OSError:
+            pass
+    return variants
+
+
+def pick_encoding(variants, accept):
+    """Best precompressed variant for an Accept-Encoding header (werkzeug Accept object)."""
+    for encoding, _ in ENCODINGS:
+        if encoding in variants and accept.quality(encoding) > 0:
+            return encoding
+    return 'identity'
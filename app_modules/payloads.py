@@ -0,0 +1,224 @@
+import hashlib
+import json
+import threading
+
+from admin_modules.graph import NEIGHBORS_FIELD, build_adjacency
+from admin_modules.polyline import FORMAT, decode_plan, encode_street, is_compact
+from admin_modules.simplify import LOD_FIELD, pick_lod
+from admin_modules.spatial import GridIndex, path_bbox
+from .artifacts import ARTIFACT_DIR, load_geometry_variants, write_geometry_artifacts
+from .state import MUTABLE_FIELDS
+
+
+# What the page needs of every street for list, stats and markers in viewport mode
+SUMMARY_FIELDS = ('name', 'households', 'length', 'coords', 'district')
+
+# Viewport responses leave out the house points below this zoom level
+HOUSES_MIN_ZOOM = 15
+
+
+def build_geometry(data):
+    """Serializes the immutable part of the plan. Returns (body, etag).
+
+    Plans built with geometry_format 'polyline6' are sent in that format too.
+    """
+    compact = is_compact(data)
+    streets = {}
+    for s_id, s in data.get('streets', {}).items():
+        # The whole plan is only loaded for small plans, at full detail (exports need it)
+        # Neighbors come separately from /api/neighbors
+        geo = {k: v for k, v in s.items() if k not in MUTABLE_FIELDS and k not in (LOD_FIELD, NEIGHBORS_FIELD)}
+        streets[s_id] = encode_street(geo) if compact else geo
+
+    payload = {"streets": streets}
+    if compact:
+        payload["format"] = FORMAT
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()[:16]
+
+
+def build_summary(data):
+    """Geometry-free part of the plan: {id: {name, households, length, coords, district}}."""
+    return {
+        "streets": {
+            s_id: {k: s[k] for k in SUMMARY_FIELDS if k in s}
+            for s_id, s in data.get('streets', {}).items()
+        }
+    }
+
+
+def build_viewport(data, ids, zoom=None):
+    """Geometry (path, houses) of the streets 'ids', in the plan's format.
+
+    'path' is the level of detail for 'zoom'; the street's "lod" names the
+    level, null means full detail.
+    """
+    compact = is_compact(data)
+    with_houses = zoom is None or zoom >= HOUSES_MIN_ZOOM
+    streets = {}
+    for s_id in sorted(ids):
+        s = data['streets'].get(s_id)
+        if s is None:
+            continue
+        path, level = pick_lod(s, zoom)
+        geo = {"path": path, "lod": level}
+        if with_houses:
+            geo["houses"] = s.get('houses', [])
+        streets[s_id] = encode_street(geo) if compact else geo
+
+    payload = {"streets": streets}
+    if compact:
+        payload["format"] = FORMAT
+    return payload
+
+
+def build_status(data, version, plan=None, ids=None):
+    """Status table {id: [status, user]} of all streets, or only of 'ids' (delta)."""
+    streets = data.get('streets', {})
+    full = ids is None
+    if full:
+        ids = streets.keys()
+    return {
+        "version": version,
+        "plan": plan,
+        "full": full,
+        "streets": {
+            s_id: [streets[s_id].get('status', 'free'), streets[s_id].get('user', '')]
+            for s_id in ids if s_id in streets
+        }
+    }
+
+
+def publish_geometry(plan_file, out_dir=ARTIFACT_DIR):
+    """Writes the precompressed geometry artifacts for a plan file. Returns the paths.
+
+    Reads the file back like the server does, so the etag matches the one
+    the server computes for it.
+    """
+    with open(plan_file, 'r', encoding='utf-8') as f:
+        data = decode_plan(json.load(f))
+    body, etag = build_geometry(data)
+    return write_geometry_artifacts(body, etag, out_dir)
+
+
+class GeometryCache:
+    """Geometry payload of the current plan, rebuilt only when the plan changes.
+
+    With an artifact_dir the precompressed variants written at publish time
+    are used (and written once if missing, e.g. after admin edits), so no
+    request has to compress anything.
+    """
+
+    def __init__(self, store, artifact_dir=None):
+        self.store = store
+        self.artifact_dir = artifact_dir
+        self.builds = 0
+        self._key = None
+        self._body = None
+        self._etag = None
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def _rebuild(self, data):
+        self._body, self._etag = build_geometry(data)
+        self._variants = {'identity': self._body}
+        if self.artifact_dir:
+            variants = load_geometry_variants(self._etag, self.artifact_dir)
+            if 'gzip' not in variants:
+                try:
+                    write_geometry_artifacts(self._body, self._etag, self.artifact_dir)
+                except OSError as e:
+                    print(f"⚠️ Konnte Geometrie-Artefakte nicht schreiben: {e}")
+                variants = load_geometry_variants(self._etag, self.artifact_dir)
+            self._variants.update(variants)
+        self.builds += 1
+
+    def get(self):
+        """Returns (body, etag) of the current plan."""
+        data = self.store.get()
+        key = self.store.plan_generation
+        with self._lock:
+            if key != self._key:
+                self._rebuild(data)
+                self._key = key
+            return self._body, self._etag
+
+    def variants(self):
+        """Returns ({content_encoding: bytes}, etag) of the current plan."""
+        self.get()
+        with self._lock:
+            return self._variants, self._etag
+
+
+class StreetIndex:
+    """Grid index over the street bounding boxes of the current plan.
+
+    Rebuilt like GeometryCache, i.e. only when the plan itself changes;
+    status updates do not touch it.
+    """
+
+    def __init__(self, store, cell_size=0.01):
+        self.store = store
+        self.cell_size = cell_size
+        self.builds = 0
+        self._key = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _rebuild(self, data):
+        index = GridIndex(self.cell_size)
+        for s_id, s in data.get('streets', {}).items():
+            bbox = path_bbox(s.get('path') or [])
+            if bbox is None and s.get('coords'):
+                lat, lon = s['coords']
+                bbox = [lat, lon, lat, lon]
+            if bbox:
+                index.insert(s_id, bbox)
+        self._index = index
+        self.builds += 1
+
+    def query(self, bbox, zoom=None):
+        """Returns the viewport payload of all streets intersecting bbox."""
+        data = self.store.get()
+        key = self.store.plan_generation
+        with self._lock:
+            if key != self._key:
+                self._rebuild(data)
+                self._key = key
+            ids = self._index.query(bbox)
+        return build_viewport(data, ids, zoom)
+
+
+class NeighborGraph:
+    """Street adjacency {id: [[neighbor id, distance], ...]} of the current plan.
+
+    Uses the graph stored at build time (admin_modules/graph.py). Plans
+    without it, or with streets added by hand since, get it computed here,
+    once per plan change like StreetIndex.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.builds = 0
+        self._key = None
+        self._graph = None
+        self._lock = threading.Lock()
+
+    def _rebuild(self, data):
+        streets = data.get('streets', {})
+        if all(NEIGHBORS_FIELD in s for s in streets.values() if s.get('path')):
+            # Deleted streets may still be listed as neighbors
+            self._graph = {s_id: [n for n in s.get(NEIGHBORS_FIELD, []) if n[0] in streets]
+                           for s_id, s in streets.items()}
+        else:
+            self._graph = build_adjacency(streets)
+            self.builds += 1
+
+    def get(self):
+        data = self.store.get()
+        key = self.store.plan_generation
+        with self._lock:
+            if key != self._key:
+                self._rebuild(data)
+                self._key = key
+            return self._graph
@@ -0,0 +1,276 @@
+"""Walking order for the streets of one helper, exported as GPX.
+
+Every line of every street is a segment that has to be walked completely,
+in either direction. The route is an open path through all segments; its
+cost is the sum of the gaps between the end of one segment and the start
+of the next (the segments themselves always have the same length).
+
+Segment i has its start at point 2i and its end at 2i+1. An oriented
+segment v is entered at point v and left at point v ^ 1, so flipping the
+direction is v ^ 1. A greedy nearest-neighbour tour (from a few starting
+segments) is improved with 2-opt (reverse a block: order and directions)
+and Or-opt (move a block of up to three segments, optionally reversed),
+both restricted to links between near neighbours, until no move helps.
+The rest of the time budget goes into perturbing the best tour and
+searching again (iterated local search, seeded, so results repeat).
+"""
+
+import math
+import random
+import time
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from admin_modules.spatial import LocalProjection
+
+TIME_BUDGET_S = 0.3
+GREEDY_STARTS = 4
+# Larger requests are refused: matrix and neighbour lists grow with n^2
+MAX_SEGMENTS = 300
+# Moves are only tried towards the closest end points of other segments
+NEIGHBORS = 20
+OR_OPT_MAX = 3
+# Perturbations in a row without improvement before giving up early
+PATIENCE = 30
+
+_EPS = 1e-9
+
+
+def _matrix(segments):
+    """Distance matrix (m) over all segment end points."""
+    lat0 = sum(s[0][0] for s in segments) / len(segments)
+    lon0 = sum(s[0][1] for s in segments) / len(segments)
+    proj = LocalProjection(lat0, lon0)
+    pts = []
+    for s in segments:
+        pts.append(proj(s[0][0], s[0][1]))
+        pts.append(proj(s[-1][0], s[-1][1]))
+    return [[math.hypot(x - qx, y - qy) for qx, qy in pts] for x, y in pts]
+
+
+def tour_cost(tour, dist):
+    return sum(dist[a ^ 1][b] for a, b in zip(tour, tour[1:]))
+
+
+def _greedy(start, n, dist):
+    tour = [start]
+    remaining = [p for p in range(2 * n) if p >> 1 != start >> 1]
+    while remaining:
+        row = dist[tour[-1] ^ 1]
+        p = min(remaining, key=row.__getitem__)
+        tour.append(p)
+        remaining.remove(p)
+        remaining.remove(p ^ 1)
+    return tour
+
+
+def _neighbors(dist, k):
+    """The k closest end points of other segments, for every end point."""
+    points = range(len(dist))
+    return [[q for q in sorted(points, key=row.__getitem__)[:k + 2] if q >> 1 != p >> 1][:k]
+            for p, row in enumerate(dist)]
+
+
+def _positions(tour):
+    pos = [0] * len(tour)
+    for k, v in enumerate(tour):
+        pos[v >> 1] = k
+    return pos
+
+
+def _two_opt(tour, dist, near, deadline):
+    """One pass of 2-opt over an open path. Returns True if the tour got shorter.
+
+    Reversing tour[i..j] replaces the links a -> tour[i] and tour[j] -> c
+    by a -> (exit of tour[j]) and (entry of tour[i]) -> c. Only moves that
+    make one of the new links a near-neighbour link are tried, plus all
+    reversals of a head or tail of the path.
+    """
+    n = len(tour)
+    pos = _positions(tour)
+    improved = False
+
+    def gain(i, j):
+        ti, tj = tour[i], tour[j]
+        before = after = 0.0
+        if i > 0:
+            a = tour[i - 1] ^ 1
+            before += dist[a][ti]
+            after += dist[a][tj ^ 1]
+        if j + 1 < n:
+            c = tour[j + 1]
+            before += dist[tj ^ 1][c]
+            after += dist[ti][c]
+        return before - after
+
+    for k in range(n):
+        if time.perf_counter() > deadline:
+            break
+        # Reversing a head or tail of the path only changes one link, try all of them
+        moves = [(0, k), (k, n - 1)]
+        # New link (exit of position k-1) -> q: q must become the entry at k, i.e. be the exit at j
+        if k > 0:
+            for q in near[tour[k - 1] ^ 1]:
+                j = pos[q >> 1]
+                if j >= k and tour[j] == q ^ 1:
+                    moves.append((k, j))
+        # New link p -> (entry of position k+1): p must be the entry at i
+        if k + 1 < n:
+            for p in near[tour[k + 1]]:
+                i = pos[p >> 1]
+                if i <= k and tour[i] == p:
+                    moves.append((i, k))
+        for i, j in moves:
+            if gain(i, j) > _EPS:
+                tour[i:j + 1] = [v ^ 1 for v in reversed(tour[i:j + 1])]
+                for m in range(i, j + 1):
+                    pos[tour[m] >> 1] = m
+                improved = True
+                break
+    return improved
+
+
+def _or_opt(tour, dist, near, deadline):
+    """One pass of Or-opt: move blocks of 1..OR_OPT_MAX segments next to a near
+    neighbour (optionally reversed). Returns True if the tour got shorter."""
+    improved = False
+    n = len(tour)
+    pos = _positions(tour)
+    for length in range(1, OR_OPT_MAX + 1):
+        i = 0
+        while i + length <= n:
+            if time.perf_counter() > deadline:
+                return improved
+            block = tour[i:i + length]
+            prev = tour[i - 1] ^ 1 if i > 0 else None
+            nxt = tour[i + length] if i + length < n else None
+            # Gain of taking the block out
+            removed = 0.0
+            if prev is not None:
+                removed += dist[prev][block[0]]
+            if nxt is not None:
+                removed += dist[block[-1] ^ 1][nxt]
+            if prev is not None and nxt is not None:
+                removed -= dist[prev][nxt]
+
+            # Insert after position k (k = -1: in front); k next to or inside the block changes nothing
+            slots = {-1, n - 1}
+            for entry in (block[0], block[-1] ^ 1):
+                for p in near[entry]:
+                    k = pos[p >> 1]
+                    if tour[k] ^ 1 == p:
+                        slots.add(k)
+            best = (removed - _EPS, None, False)
+            for k in slots:
+                if i - 1 <= k <= i + length - 1:
+                    continue
+                p = tour[k] ^ 1 if k >= 0 else None
+                q = tour[k + 1] if k + 1 < n else None
+                base = dist[p][q] if p is not None and q is not None else 0.0
+                for entry, exit_, rev in ((block[0], block[-1] ^ 1, False), (block[-1] ^ 1, block[0], True)):
+                    added = -base
+                    if p is not None:
+                        added += dist[p][entry]
+                    if q is not None:
+                        added += dist[exit_][q]
+                    if added < best[0]:
+                        best = (added, k, rev)
+            if best[1] is not None:
+                k, rev = best[1], best[2]
+                moved = [v ^ 1 for v in reversed(block)] if rev else block
+                if k < i:
+                    tour[:] = tour[:k + 1] + moved + tour[k + 1:i] + tour[i + length:]
+                else:
+                    tour[:] = tour[:i] + tour[i + length:k + 1] + moved + tour[k + 1:]
+                pos = _positions(tour)
+                improved = True
+            i += 1
+    return improved
+
+
+def _local_search(tour, dist, near, deadline):
+    while time.perf_counter() < deadline:
+        improved = _two_opt(tour, dist, near, deadline)
+        improved = _or_opt(tour, dist, near, deadline) or improved
+        if not improved:
+            break
+
+
+def plan_route(segments, time_budget=TIME_BUDGET_S):
+    """Order and direction for walking all segments [[lat, lon], ...].
+
+    Returns (segments in walking order, reversed where needed, stats) with
+    stats = {"segments", "greedy_m", "gaps_m", "ms"}; gaps_m is the
+    walking distance between segments. The time budget includes the setup,
+    only the first greedy tour and the neighbour lists are built regardless.
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + time_budget
+    segments = [s for s in segments if s]
+    n = len(segments)
+    if n == 0:
+        return [], {"segments": 0, "greedy_m": 0, "gaps_m": 0, "ms": 0}
+    dist = _matrix(segments)
+
+    # Greedy from the segments farthest out (a route usually starts at an edge) and the first one
+    far = sorted(range(n), key=lambda i: -sum(dist[2 * i][2 * j] for j in range(0, n, max(1, n // 16))))
+    starts = [0] + [i for i in far[:GREEDY_STARTS - 1] if i != 0]
+    tour, greedy = None, None
+    for v in (2 * i + f for i in starts for f in (0, 1)):
+        # Further starts only while there is time left
+        if tour is not None and time.perf_counter() > deadline:
+            break
+        t = _greedy(v, n, dist)
+        cost = tour_cost(t, dist)
+        if tour is None or cost < greedy:
+            tour, greedy = t, cost
+
+    near = _neighbors(dist, NEIGHBORS)
+    _local_search(tour, dist, near, deadline)
+
+    # Time left: perturb the best tour (reverse a random block) and search again, keep improvements
+    rnd = random.Random(n)
+    best, best_cost = tour, tour_cost(tour, dist)
+    stale = 0
+    while n > 3 and stale < PATIENCE and time.perf_counter() < deadline:
+        stale += 1
+        tour = list(best)
+        for _ in range(2):
+            i = rnd.randrange(n - 1)
+            j = rnd.randrange(i + 1, min(n, i + 1 + max(3, n // 10)))
+            tour[i:j + 1] = [v ^ 1 for v in reversed(tour[i:j + 1])]
+        _local_search(tour, dist, near, deadline)
+        cost = tour_cost(tour, dist)
+        if cost < best_cost - _EPS:
+            best, best_cost = tour, cost
+            stale = 0
+    tour = best
+
+    ordered = [segments[v >> 1] if v % 2 == 0 else segments[v >> 1][::-1] for v in tour]
+    return ordered, {
+        "segments": n,
+        "greedy_m": round(greedy),
+        "gaps_m": round(tour_cost(tour, dist)),
+        "ms": round((time.perf_counter() - start_time) * 1000)
+    }
+
+
+def to_gpx(segments, name):
+    """GPX 1.1 with one track segment through all points (navigation apps follow it best)."""
+    out = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="FlyerFerteiler" xmlns="http://www.topografix.com/GPX/1/1">',
+        '  <metadata>',
+        f'    <name>Flyer Route für {escape(name)}</name>',
+        '    <desc>Automatisch optimierte Route</desc>',
+        f'    <time>{datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}</time>',
+        '  </metadata>',
+        '  <trk>',
+        '    <name>Flyer Route</name>',
+        '    <trkseg>'
+    ]
+    for seg in segments:
+        for p in seg:
+            out.append(f'      <trkpt lat={quoteattr(str(p[0]))} lon={quoteattr(str(p[1]))}></trkpt>')
+    out += ['    </trkseg>', '  </trk>', '</gpx>', '']
+    return '\n'.join(out)
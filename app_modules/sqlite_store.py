@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+
+from admin_modules.polyline import decode_plan
+from .state import StateBackend, _stat_sig, carry_status, write_json_atomic
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streets (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    households INTEGER NOT NULL DEFAULT 0,
+    length INTEGER NOT NULL DEFAULT 0,
+    coords TEXT,
+    status TEXT NOT NULL DEFAULT 'free',
+    user TEXT NOT NULL DEFAULT '',
+    extra TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_streets_status ON streets(status);
+CREATE INDEX IF NOT EXISTS idx_streets_user ON streets(user);
+CREATE INDEX IF NOT EXISTS idx_streets_version ON streets(version);
+
+CREATE TABLE IF NOT EXISTS geometry (
+    street_id TEXT PRIMARY KEY REFERENCES streets(id) ON DELETE CASCADE,
+    path TEXT,
+    houses TEXT
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Keys with their own columns, everything else of a street goes to 'extra'
+COLUMNS = ('name', 'households', 'length', 'coords', 'status', 'user')
+GEOMETRY = ('path', 'houses')
+
+
+class SqliteStateStore(StateBackend):
+    """State backend on SQLite in WAL mode.
+
+    Status changes are row updates, readers in other workers only fetch the
+    rows whose version is newer than theirs. streets_status.json stays the
+    exchange format: it is imported whenever it changes on disk (new plan
+    via git) and compact() exports the database back into it.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path, db_path, compact_interval=60):
+        super().__init__(path, compact_interval)
+        self.db_path = db_path
+        self.row_reads = 0
+        self._db = None
+        self._db_pid = None
+        self._plan_version = None
+
+    def _conn(self):
+        # One connection per worker process, guarded by self._lock
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('PRAGMA foreign_keys=ON')
+            db.executescript(SCHEMA)
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def _meta(self, db, key, default=None):
+        row = db.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, db, key, value):
+        db.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (key, json.dumps(value, ensure_ascii=False)))
+
+    # --- Reading ---
+
+    def _update(self):
+        try:
+            sig = _stat_sig(self.path)
+        except FileNotFoundError:
+            # Survey stopped (file archived) - same behaviour as the JSON backend
+            self.data = None
+            raise
+
+        db = self._conn()
+        if sig != self._meta(db, '_json_sig'):
+            with self.locked():
+                if sig != self._meta(db, '_json_sig'):
+                    self._import(db, sig)
+
+        if self.data is None or self._meta(db, '_plan_version', 0) != self._plan_version:
+            self._load_all(db)
+            return True
+
+        version = self._meta(db, '_version', 0)
+        if version != self.version:
+            streets = self.data['streets']
+            rows = db.execute('SELECT id, status, user, version FROM streets WHERE version > ?', (self.version,))
+            for s_id, status, user, row_version in rows:
+                if s_id in streets:
+                    streets[s_id]['status'] = status
+                    streets[s_id]['user'] = user
+                    self.changed_at[s_id] = row_version
+                self.row_reads += 1
+            self.version = version
+        return False
+
+    def _load_all(self, db):
+        geometry = {}
+        for s_id, path, houses in db.execute('SELECT street_id, path, houses FROM geometry'):
+            geometry[s_id] = (path, houses)
+
+        streets = {}
+        for row in db.execute('SELECT id, name, households, length, coords, status, user, extra FROM streets'):
+            s_id, name, households, length, coords, status, user, extra = row
+            street = json.loads(extra) if extra else {}
+            street.update({
+                "name": name,
+                "households": households,
+                "length": length,
+                "coords": json.loads(coords) if coords else None,
+                "status": status,
+                "user": user
+            })
+            path, houses = geometry.get(s_id, (None, None))
+            if path is not None: street['path'] = json.loads(path)
+            if houses is not None: street['houses'] = json.loads(houses)
+            streets[s_id] = street
+
+        self.data = {"metadata": self._meta(db, 'plan', {}), "streets": streets}
+        self._plan_version = self._meta(db, '_plan_version', 0)
+        self.version = self._meta(db, '_version', 0)
+
+    # --- Writing ---
+
+    def _street_row(self, s_id, s, version):
+        extra = {k: v for k, v in s.items() if k not in COLUMNS and k not in GEOMETRY}
+        return (
+            s_id, s.get('name', ''), int(s.get('households', 0) or 0), int(s.get('length', 0) or 0),
+            json.dumps(s.get('coords')), s.get('status', 'free'), s.get('user', ''),
+            json.dumps(extra, ensure_ascii=False) if extra else None, version
+        )
+
+    def _write_street(self, db, s_id, s, version, geometry=True):
+        # Upsert instead of REPLACE, which would cascade-delete the geometry row
+        db.execute('INSERT INTO streets (id, name, households, length, coords, status, user, extra, version) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                   'ON CONFLICT(id) DO UPDATE SET name = excluded.name, households = excluded.households, '
+                   'length = excluded.length, coords = excluded.coords, status = excluded.status, '
+                   'user = excluded.user, extra = excluded.extra, version = excluded.version',
+                   self._street_row(s_id, s, version))
+        if geometry:
+            db.execute('INSERT OR REPLACE INTO geometry (street_id, path, houses) VALUES (?, ?, ?)', (
+                s_id,
+                json.dumps(s['path']) if 'path' in s else None,
+                json.dumps(s['houses']) if 'houses' in s else None
+            ))
+
+    def _write_all(self, db, data):
+        """Replaces the whole plan in one transaction (import / admin edits)."""
+        version = self._meta(db, '_version', 0) + 1
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM geometry')
+            db.execute('DELETE FROM streets')
+            for s_id, s in data.get('streets', {}).items():
+                self._write_street(db, s_id, s, version)
+            self._set_meta(db, 'plan', data.get('metadata', {}))
+            self._set_meta(db, '_version', version)
+            self._set_meta(db, '_plan_version', self._meta(db, '_plan_version', 0) + 1)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def _import(self, db, sig):
+        print(f"📥 Importiere {self.path} in {self.db_path}...")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = decode_plan(json.load(f))
+        self._write_all(db, data)
+        self._set_meta(db, '_json_sig', sig)
+        self._set_meta(db, '_exported_version', self._meta(db, '_version', 0))
+
+    def commit(self, ops):
+        # Row-level: only the streets touched by the batch are written
+        with self.locked():
+            self._refresh()
+            results, merged = self._run_ops(ops)
+            if merged:
+                db = self._conn()
+                version = self.version + 1
+                db.execute('BEGIN IMMEDIATE')
+                try:
+                    streets = self.data['streets']
+                    for s_id in merged:
+                        if s_id in streets:
+                            self._write_street(db, s_id, streets[s_id], version, geometry=False)
+                    self._set_meta(db, '_version', version)
+                    db.execute('COMMIT')
+                except Exception:
+                    db.execute('ROLLBACK')
+                    self.data = None
+                    raise
+                self.version = version
+
+        if merged:
+            self._ensure_compactor()
+        return results
+
+    def save(self, data):
+        with self.locked():
+            db = self._conn()
+            if self.data is not None:
+                # Rows other workers committed since the caller read the state win
+                rows = db.execute('SELECT id, status, user FROM streets WHERE version > ?', (self.version,))
+                carry_status(data, {s_id: {"status": status, "user": user} for s_id, status, user in rows})
+            self._write_all(db, data)
+            self.data = data
+            self.plan_generation += 1
+            self._plan_version = self._meta(db, '_plan_version', 0)
+            self.version = self._meta(db, '_version', 0)
+            self._reset_tracking()
+        self._ensure_compactor()
+
+    def compact(self):
+        # Exports the database as streets_status.json (for git sync and backups)
+        with self.locked():
+            try:
+                self._refresh()
+            except FileNotFoundError:
+                return False
+            db = self._conn()
+            if self._meta(db, '_exported_version') == self.version:
+                return False
+            self.export(self.path)
+            self.compactions += 1
+            return True
+
+    def export(self, path):
+        """Writes the current state in the streets_status.json shape."""
+        with self.locked():
+            db = self._conn()
+            self._load_all(db)
+            sig = write_json_atomic(path, self.data)
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                # Our own export must not trigger a re-import
+                self._set_meta(db, '_json_sig', sig)
+                self._set_meta(db, '_exported_version', self.version)
+
+    def stats(self):
+        res = super().stats()
+        with self._lock:
+            res["row_reads"] = self.row_reads
+        return res
@@ -0,0 +1,454 @@
+import abc
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from admin_modules.polyline import decode_plan, encode_plan, is_compact
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+try:
+    import config
+except ImportError:
+    config = None
+
+
+# Fields that change while a survey is running - everything else is plan geometry
+MUTABLE_FIELDS = ('status', 'user')
+
+
+def plan_differs(old, new):
+    """True if the documents differ in more than status/user of their streets."""
+    if old is None or new is None:
+        return True
+    if old.get('metadata') != new.get('metadata'):
+        return True
+    old_streets, new_streets = old.get('streets', {}), new.get('streets', {})
+    if old_streets.keys() != new_streets.keys():
+        return True
+    for s_id, s in new_streets.items():
+        o = old_streets[s_id]
+        if any(o.get(k) != s.get(k) for k in o.keys() | s.keys() if k not in MUTABLE_FIELDS):
+            return True
+    return False
+
+
+def carry_status(data, streets):
+    """Copies status/user of {street_id: street} onto the streets of data that still exist."""
+    target = data.get('streets', {})
+    for s_id, s in streets.items():
+        if s_id in target:
+            target[s_id].update({k: s[k] for k in MUTABLE_FIELDS if k in s})
+
+
+def _stat_sig(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def write_json_atomic(path, data):
+    """Writes data in the streets_status.json format and returns the new file signature."""
+    if is_compact(data):
+        # In memory geometry is always decoded, on disk it stays in the plan's format
+        data = encode_plan(data)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    # os.replace keeps inode and mtime, so the signature is already final
+    sig = _stat_sig(tmp)
+    os.replace(tmp, path)
+    return sig
+
+
+class StateBackend(abc.ABC):
+    """Interface of the state stores behind load_data()/save_data().
+
+    Backends implement _update(), commit(), save() and compact(). The
+    document they hand out always has the streets_status.json shape and is
+    shared by all requests of the worker. 'version' grows with every change,
+    'plan_generation' whenever more than status/user has changed.
+
+    For delta feeds the store remembers the version at which each street
+    last changed; changed_since() answers from that.
+    """
+
+    backend = None
+
+    def __init__(self, path, compact_interval=60):
+        self.path = path
+        self.lock_path = os.path.splitext(path)[0] + '.lock'
+        self.compact_interval = compact_interval
+
+        self.data = None
+        self.version = 0
+        self.plan_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+        self.changed_at = {}    # street id -> version of its last status change
+        self.delta_floor = 0    # changes at or before this version are not tracked
+
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._compactor_pid = None
+
+    def get(self):
+        """Returns the cached document (shared, callers must not mutate without save())."""
+        with self._lock:
+            if self._refresh():
+                self.misses += 1
+            else:
+                self.hits += 1
+            return self.data
+
+    def _refresh(self):
+        """Brings the cache up to date. Returns True if the whole document was re-read."""
+        old = self.data
+        reloaded = self._update()
+        if reloaded:
+            self._track_reload(old)
+        return reloaded
+
+    @abc.abstractmethod
+    def _update(self):
+        """Backend specific part of _refresh()."""
+
+    def _track_reload(self, old):
+        # Another worker compacting the journal makes us re-read an unchanged plan
+        if plan_differs(old, self.data):
+            self.plan_generation += 1
+        # After a full re-read we only know the state, not which records led
+        # there: mark every street whose status differs from our old copy.
+        streets = self.data.get('streets', {}) if self.data else {}
+        if old is None or old.get('streets', {}).keys() != streets.keys():
+            self._reset_tracking()
+            return
+        for s_id, s in streets.items():
+            o = old['streets'][s_id]
+            if (o.get('status'), o.get('user')) != (s.get('status'), s.get('user')):
+                self.changed_at[s_id] = max(self.changed_at.get(s_id, 0), self.version)
+
+    def _reset_tracking(self):
+        self.changed_at = {}
+        self.delta_floor = self.version
+
+    def changed_since(self, since):
+        """Ids of streets changed after version 'since', or None if that is out of range."""
+        with self._lock:
+            self._refresh()
+            if since < self.delta_floor or since > self.version:
+                return None
+            return [s_id for s_id, v in self.changed_at.items() if v > since]
+
+    @abc.abstractmethod
+    def commit(self, ops):
+        """Runs a batch of ops on fresh state under the writer lock.
+
+        Each op is a callable streets -> {street_id: {field: value}}; it sees
+        the effects of the ops before it. Returns the changes (or the
+        exception) of every op.
+        """
+
+    @abc.abstractmethod
+    def save(self, data):
+        """Replaces the whole document."""
+
+    @abc.abstractmethod
+    def compact(self):
+        """Brings streets_status.json on disk up to date. Returns True if it was rewritten."""
+
+    def append(self, changes):
+        """Records {street_id: {field: value}} and applies it."""
+        self.commit([lambda streets: changes])
+        return self.version
+
+    def _run_ops(self, ops):
+        """Applies ops to the cached streets, returns (results, merged changes)."""
+        results, merged = [], {}
+        for op in ops:
+            try:
+                changes = op(self.data['streets'])
+            except Exception as e:
+                results.append(e)
+                continue
+            self._apply(changes, self.version + 1)
+            for s_id, fields in changes.items():
+                merged.setdefault(s_id, {}).update(fields)
+            results.append(changes)
+        return results, merged
+
+    def _apply(self, changes, version):
+        streets = self.data.get('streets', {})
+        for s_id, fields in changes.items():
+            if s_id in streets:
+                streets[s_id].update(fields)
+                self.changed_at[s_id] = version
+
+    @contextmanager
+    def locked(self):
+        """Serializes writers within this process and across workers (re-entrant)."""
+        with self._lock:
+            if fcntl is None or self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            with open(self.lock_path, 'a') as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    # --- Background compaction ---
+
+    def _ensure_compactor(self):
+        # One thread per worker process (gunicorn forks after import)
+        if not self.compact_interval or self._compactor_pid == os.getpid():
+            return
+        self._compactor_pid = os.getpid()
+        threading.Thread(target=self._compact_loop, daemon=True).start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Journal-Kompaktierung fehlgeschlagen: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "compactions": self.compactions,
+            }
+
+
+class JsonStateStore(StateBackend):
+    """Process-wide cache of the parsed streets_status.json.
+
+    The snapshot is only re-read when the file on disk changes (inode, mtime
+    or size), e.g. after refresh_data.sh did a 'git reset --hard'.
+
+    Status changes are appended to a journal next to the snapshot
+    (streets_status.journal, one JSON record per line). Its header names the
+    snapshot it belongs to, so a journal left over from an older plan is
+    ignored. compact() folds the journal back into the snapshot.
+    """
+
+    backend = 'json'
+
+    def __init__(self, path, compact_interval=60):
+        super().__init__(path, compact_interval)
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.replayed = 0
+
+        self._sig = None
+        self._jino = None       # inode of the journal we are reading
+        self._joffset = 0       # bytes consumed so far
+        self._jvalid = False    # journal header matches our snapshot
+        self._jrecords = 0      # records not yet folded into the snapshot
+
+    def _update(self):
+        try:
+            sig = _stat_sig(self.path)
+        except FileNotFoundError:
+            self.data, self._sig = None, None
+            raise
+
+        if self.data is None or sig != self._sig:
+            self._load_snapshot(sig)
+            return True
+
+        if self._journal_replaced():
+            # Someone compacted between our two stat calls - start over
+            self._load_snapshot(_stat_sig(self.path))
+            return True
+
+        self._read_journal()
+        return False
+
+    def _load_snapshot(self, sig):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.data = decode_plan(json.load(f))
+        self._sig = sig
+        self._jino, self._joffset, self._jvalid, self._jrecords = None, 0, False, 0
+        self._read_journal()
+
+    def _journal_replaced(self):
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return self._jino is not None
+        return self._jino is not None and (st.st_ino != self._jino or st.st_size < self._joffset)
+
+    def _read_journal(self):
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            self._jino = os.fstat(f.fileno()).st_ino
+            f.seek(self._joffset)
+            chunk = f.read()
+
+        # Only consume complete lines, a writer might be mid-append
+        end = chunk.rfind(b'\n') + 1
+        if not end:
+            return
+        self._joffset += end
+
+        last_seq = self.version
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Defekter Journal-Eintrag übersprungen: {line[:80]!r}")
+                continue
+
+            if 'base' in rec:
+                self._jvalid = rec['base'] == self._sig
+                last_seq = rec['seq']
+                if self._jvalid:
+                    self.version = rec['seq']
+                continue
+
+            last_seq = rec['seq']
+            if self._jvalid:
+                self._apply(rec['changes'], rec['seq'])
+                self.version = rec['seq']
+                self._jrecords += 1
+                self.replayed += 1
+
+        if not self._jvalid:
+            # Journal of an older plan: new snapshot counts as one more change
+            self.version = last_seq + 1
+
+    # --- Writing ---
+
+    def commit(self, ops):
+        # All changes of the batch are journaled as one record
+        with self.locked():
+            self._refresh()
+            results, merged = self._run_ops(ops)
+            if merged:
+                try:
+                    self._write_record(merged)
+                except Exception:
+                    # Memory is ahead of the disk now, re-read on next access
+                    self.data, self._sig = None, None
+                    raise
+
+        if merged:
+            self._ensure_compactor()
+        return results
+
+    def _write_record(self, changes):
+        if not self._jvalid:
+            self._reset_journal(self.version)
+
+        seq = self.version + 1
+        rec = {"seq": seq, "ts": datetime.now().isoformat(timespec='seconds'), "changes": changes}
+        line = json.dumps(rec, ensure_ascii=False, sort_keys=True) + '\n'
+        with open(self.journal_path, 'ab') as f:
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self._joffset = f.tell()
+
+        self.version = seq
+        self._jrecords += 1
+
+    def save(self, data):
+        with self.locked():
+            # Changes other workers made since the caller read the state win
+            known, since = self.data is not None, self.version
+            try:
+                reloaded = self._refresh()
+            except FileNotFoundError:
+                known = False
+            if known and data is not self.data:
+                streets = self.data['streets']
+                if not reloaded:
+                    # Same snapshot: only the journal records we just read
+                    streets = {s_id: streets[s_id] for s_id, v in self.changed_at.items() if v > since}
+                carry_status(data, streets)
+            self._sig = write_json_atomic(self.path, data)
+            self.data = data
+            self.plan_generation += 1
+            self._reset_journal(self.version + 1)
+            self._reset_tracking()
+
+    def compact(self):
+        # Folds the journal into the snapshot
+        with self.locked():
+            try:
+                self._refresh()
+            except FileNotFoundError:
+                return False
+            if not self._jvalid or not self._jrecords:
+                return False
+            self._sig = write_json_atomic(self.path, self.data)
+            self._reset_journal(self.version)
+            self.compactions += 1
+            return True
+
+    def _reset_journal(self, seq):
+        tmp = self.journal_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"base": self._sig, "seq": seq}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+
+        st = os.stat(self.journal_path)
+        self._jino, self._joffset = st.st_ino, st.st_size
+        self._jvalid, self._jrecords = True, 0
+        self.version = seq
+
+    def stats(self):
+        res = super().stats()
+        with self._lock:
+            res.update({"journal_records": self._jrecords, "replayed": self.replayed})
+        return res
+
+
+def open_store(path, backend='json', compact_interval=60, db_path=None):
+    """Creates the configured state backend ('json' or 'sqlite')."""
+    if backend == 'sqlite':
+        from .sqlite_store import SqliteStateStore
+        return SqliteStateStore(path, db_path or os.path.splitext(path)[0] + '.db', compact_interval)
+    return JsonStateStore(path, compact_interval)
+
+
+if __name__ == '__main__':
+    # Used by refresh_data.sh to bring streets_status.json up to date before git sync
+    target = sys.argv[1] if len(sys.argv) > 1 else 'data/streets_status.json'
+    backend = getattr(config, 'STATE_BACKEND', 'json') if config else 'json'
+    db_path = getattr(config, 'STATE_DB', None) if config else None
+    if open_store(target, backend, compact_interval=0, db_path=db_path).compact():
+        print("streets_status.json aktualisiert.")
@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class _Pending:
+    def __init__(self, op):
+        self.op = op
+        self.done = False
+        self.result = None
+
+
+class GroupCommitWriter:
+    """Coalesces concurrent writes of this worker into one journal record.
+
+    The first caller becomes the leader: it waits for the cross-process lock
+    (and an optional window), then commits everything queued up meanwhile in
+    one go. Other callers just wait for their result.
+    """
+
+    def __init__(self, store, window=0.0):
+        self.store = store
+        self.window = window
+        self._pending = []
+        self._leader = False
+        self._cond = threading.Condition()
+
+    def submit(self, op):
+        """Runs op (streets -> changes) in the next batch and returns its changes."""
+        item = _Pending(op)
+        with self._cond:
+            self._pending.append(item)
+            while self._leader and not item.done:
+                self._cond.wait()
+            if not item.done:
+                self._leader = True
+
+        if not item.done:
+            self._lead()
+
+        if isinstance(item.result, Exception):
+            raise item.result
+        return item.result
+
+    def _lead(self):
+        try:
+            if self.window:
+                time.sleep(self.window)
+            with self.store.locked():
+                with self._cond:
+                    batch, self._pending = self._pending, []
+                try:
+                    results = self.store.commit([p.op for p in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+            for p, res in zip(batch, results):
+                p.result, p.done = res, True
+        finally:
+            with self._cond:
+                self._leader = False
+                self._cond.notify_all()
@@ -0,0 +1,75 @@
+"""District partitioning (admin_modules/districts.py) on a generated town.
+
+Builds a grid town with n street segments and random household counts,
+computes the adjacency (admin_modules/graph.py) and splits it into k
+districts. Prints time, households per district and how many districts
+are connected.
+
+Usage: python benchmarks/bench_districts.py [n] [k]
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from admin_modules.districts import partition
+from admin_modules.graph import add_neighbors
+from benchmarks.town import block_edges
+
+
+def town(n, seed=1):
+    rnd = random.Random(seed)
+    size = int((n / 2) ** 0.5) + 1
+    streets = {}
+    for i, j, d, (a, b) in block_edges(size, rnd):
+        streets[f"s{i}_{j}_{d}"] = {
+            "name": f"Straße {i}/{j}",
+            "households": rnd.choice((0, 2, 5, 10, 20, 40)),
+            "coords": [(a[0] + b[0]) / 2, (a[1] + b[1]) / 2],
+            "path": [[a, b]]
+        }
+        if len(streets) >= n:
+            break
+    return streets
+
+
+def connected(ids, streets):
+    ids = set(ids)
+    start = next(iter(ids))
+    seen, stack = {start}, [start]
+    while stack:
+        for nb, _ in streets[stack.pop()]['neighbors']:
+            if nb in ids and nb not in seen:
+                seen.add(nb)
+                stack.append(nb)
+    return len(seen) == len(ids)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    streets = town(n)
+    start = time.perf_counter()
+    add_neighbors(streets)
+    graph_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    district, stats = partition(streets, k)
+    part_s = time.perf_counter() - start
+
+    groups = {}
+    for s_id, d in district.items():
+        groups.setdefault(d, []).append(s_id)
+    loads = stats['households']
+    ok = sum(connected(g, streets) for g in groups.values())
+    print(f"{len(streets)} Straßen, {k} Bezirke: Nachbarschaften {graph_s:.1f}s, Aufteilung {part_s:.2f}s")
+    print(f"  Haushalte pro Bezirk: Ziel {stats['target']}, min {min(loads)}, max {max(loads)}, "
+          f"Verschiebungen {stats['moved']}")
+    print(f"  zusammenhängend: {ok}/{len(groups)}")
+
+
+if __name__ == '__main__':
+    main()
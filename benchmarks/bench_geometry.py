@@ -0,0 +1,66 @@
+"""Compares /api/geometry served from precompressed artifacts against
+compressing per request (and against no compression at all).
+
+Usage: python benchmarks/bench_geometry.py [plan.json] [requests]
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    plan = os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else os.path.join(ROOT, 'data', 'streets_status.json')
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    # Run against a copy so the real data/ stays untouched
+    work = tempfile.mkdtemp()
+    os.makedirs(os.path.join(work, 'data'))
+    shutil.copy(plan, os.path.join(work, 'data', 'streets_status.json'))
+    os.chdir(work)
+
+    import app as webapp
+    from app_modules.payloads import publish_geometry
+    publish_geometry(webapp.DATA_FILE)
+    client = webapp.app.test_client()
+    body, etag = webapp.geometry_cache.get()
+
+    def timed(headers):
+        client.get('/api/geometry', headers=headers)  # warm up
+        start = time.perf_counter()
+        for _ in range(n):
+            r = client.get('/api/geometry', headers=headers)
+        return (time.perf_counter() - start) / n * 1000, len(r.data)
+
+    def timed_on_the_fly():
+        # What a compressing middleware would do for every response
+        start = time.perf_counter()
+        for _ in range(n):
+            size = len(gzip.compress(client.get('/api/geometry').data, compresslevel=6))
+        return (time.perf_counter() - start) / n * 1000, size
+
+    rows = [
+        ("identity", *timed({})),
+        ("gzip, per request", *timed_on_the_fly()),
+        ("gzip, precompressed", *timed({'Accept-Encoding': 'gzip'})),
+    ]
+    variants, _ = webapp.geometry_cache.variants()
+    if 'br' in variants:
+        rows.append(("br, precompressed", *timed({'Accept-Encoding': 'br, gzip'})))
+
+    print(f"Plan: {plan} ({len(json.loads(body)['streets'])} streets, etag {etag}), {n} requests each")
+    print(f"{'variant':<22}{'bytes':>10}{'ms/request':>12}")
+    for name, ms, size in rows:
+        print(f"{name:<22}{size:>10}{ms:>12.3f}")
+
+    shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    main()
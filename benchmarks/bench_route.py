@@ -0,0 +1,47 @@
+"""Route optimization for the GPX export (app_modules/route.py) on generated street sets.
+
+Builds a grid town with irregular blocks, picks n street segments around
+a random centre (like a helper's streets) and compares the browser's
+former greedy order (starting at the first segment) with plan_route().
+
+Usage: python benchmarks/bench_route.py [n ...]
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app_modules.route import _greedy, _matrix, plan_route, tour_cost
+from benchmarks.town import block_edges, centre
+
+
+def street_set(n, seed):
+    rnd = random.Random(seed)
+    size = int(n ** 0.5) + 4
+    # Horizontal and vertical block edges, with a kink in the middle
+    edges = list(block_edges(size, rnd, kink=8))
+    segments = [line for _, _, _, line in edges]
+    rnd.shuffle(segments)
+    cx, cy = centre(size, edges)
+    segments.sort(key=lambda s: (s[0][0] - cx) ** 2 + (s[0][1] - cy) ** 2)
+    picked = segments[:n]
+    rnd.shuffle(picked)
+    return picked
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [20, 50, 100, 200, 300]
+    print(f"{'Segmente':>8} {'Greedy (alt)':>13} {'Optimiert':>10} {'Ersparnis':>9} {'Zeit':>8}")
+    for n in sizes:
+        segments = street_set(n, seed=n)
+        dist = _matrix(segments)
+        old = tour_cost(_greedy(0, n, dist), dist)
+        _, stats = plan_route(segments)
+        saving = (1 - stats['gaps_m'] / old) * 100 if old else 0
+        print(f"{n:>8} {old:>11.0f} m {stats['gaps_m']:>8} m {saving:>8.0f}% {stats['ms']:>6} ms")
+
+
+if __name__ == '__main__':
+    main()
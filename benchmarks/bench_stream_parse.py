@@ -0,0 +1,76 @@
+"""Peak memory of reading a cached Overpass answer: json.load() of the whole
+entry against streaming the elements (admin_modules/stream_json.py).
+
+Builds a synthetic 'out geom' answer with the given number of ways and
+runs build_raw_streets() on both, measuring with tracemalloc.
+
+Usage: python benchmarks/bench_stream_parse.py [ways]
+"""
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from admin_modules.overpass import build_raw_streets
+from admin_modules.raw_cache import RawCache
+from admin_modules.stream_json import ElementStream
+
+
+def synthetic_answer(path, n_ways):
+    rnd = random.Random(1)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"version":0.6,"osm3s":{"timestamp_osm_base":"2024-01-01T00:00:00Z"},"elements":[\n')
+        for i in range(n_ways):
+            lat, lon = 49.9 + rnd.random() * 0.2, 9.1 + rnd.random() * 0.2
+            geometry = [{'lat': lat + k * 1e-4, 'lon': lon + k * 1e-4} for k in range(rnd.randint(2, 40))]
+            way = {'type': 'way', 'id': i + 1, 'bounds': {}, 'nodes': list(range(len(geometry))),
+                   'geometry': geometry, 'tags': {'highway': 'residential', 'name': f"Straße {i % 3000}"}}
+            f.write(('' if i == 0 else ',\n') + json.dumps(way))
+        f.write('\n]}\n')
+
+
+def measure(func):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+
+def main():
+    n_ways = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    work = tempfile.mkdtemp()
+    try:
+        cache = RawCache(os.path.join(work, 'cache'), ttl_days=0, max_mb=0)
+        body = cache.download_path('00000', 'streets')
+        synthetic_answer(body, n_ways)
+        size = os.path.getsize(body) / 1024 / 1024
+        cache.put_file('00000', 'streets', body)
+
+        def full():
+            build_raw_streets(cache.load_entry('00000', 'streets')['data'])
+
+        def streamed():
+            build_raw_streets({'elements': ElementStream([lambda: cache.elements('00000', 'streets')])})
+
+        print(f"{n_ways} Wege, Antwort {size:.0f} MB")
+        for label, func in (("json.load", full), ("Stream", streamed)):
+            peak, elapsed = measure(func)
+            print(f"  {label:<10} Spitze {peak:7.1f} MB   {elapsed:5.1f}s")
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    main()
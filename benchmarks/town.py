@@ -0,0 +1,40 @@
+"""Generated grid town for the benchmarks: irregular blocks of 60-180 m."""
+
+DEG = 1 / 111320.0  # ~1 m in latitude
+LAT0, LON0 = 49.97, 9.15
+
+
+def point(x, y):
+    """[lat, lon] of a point x m east, y m north of the town origin."""
+    return [LAT0 + y * DEG, LON0 + x * DEG * 1.55]
+
+
+def block_edges(size, rnd, kink=0.0):
+    """Block edges of a size x size grid as (i, j, direction, [[lat, lon], ...]).
+
+    direction 0 runs east, 1 north. With kink > 0 every edge gets a middle
+    point shifted by up to kink m across it.
+    """
+    xs, ys = [0.0], [0.0]
+    for _ in range(size):
+        xs.append(xs[-1] + rnd.uniform(60, 180))
+        ys.append(ys[-1] + rnd.uniform(60, 180))
+
+    for i in range(size):
+        for j in range(size):
+            start = point(xs[i], ys[j])
+            if kink:
+                mid = point((xs[i] + xs[i + 1]) / 2, ys[j] + rnd.uniform(-kink, kink))
+                yield i, j, 0, [start, mid, point(xs[i + 1], ys[j])]
+                mid = point(xs[i] + rnd.uniform(-kink, kink), (ys[j] + ys[j + 1]) / 2)
+                yield i, j, 1, [start, mid, point(xs[i], ys[j + 1])]
+            else:
+                yield i, j, 0, [start, point(xs[i + 1], ys[j])]
+                yield i, j, 1, [start, point(xs[i], ys[j + 1])]
+
+
+def centre(size, edges):
+    """Point near the middle of the town (start of the middle edge)."""
+    for i, j, _, line in edges:
+        if i == size // 2 and j == size // 2:
+            return line[0]
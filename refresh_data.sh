@@ -29,7 +29,13 @@ log "⏱️ Cronjob-Lauf gestartet..."
 # In das Verzeichnis wechseln
 cd "$APP_DIR" || { echo "❌ Verzeichnis nicht gefunden" >> "$LOG_FILE"; exit 1; }
 
-# --- 3. Updates von GitHub holen ---
+# --- 3. Journal in streets_status.json zurückschreiben ---
+# Die App schreibt Status-Änderungen zuerst in data/streets_status.journal
+if [ -f "$DATA_FILE" ]; then
+    "$APP_DIR/venv/bin/python" -m app_modules.state "$DATA_FILE" >> "$LOG_FILE" 2>&1
+fi
+
+# --- 4. Updates von GitHub holen ---
 # Wir nutzen --quiet, um das Log sauber zu halten
 git fetch origin main > /dev/null 2>&1
 
@@ -64,7 +70,7 @@ if [ "$LOCAL" != "$REMOTE" ]; then
     fi
 
 else
-    # --- 4. User-Änderungen sichern ---
+    # --- 5. User-Änderungen sichern ---
     git add "$DATA_FILE"
     if ! git diff --cached --quiet; then
         log "☁️ Synchronisiere Helfer-Daten mit GitHub..."
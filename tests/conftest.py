@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules are imported from the repository root, like app.py and admin.py do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
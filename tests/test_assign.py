@@ -0,0 +1,46 @@
+"""The NumPy engine of admin_modules/assign.py against the plain Python one."""
+
+import random
+
+import pytest
+
+from admin_modules.assign import nearest_streets
+
+pytest.importorskip('numpy')
+
+DEG = 1 / 111320.0  # ~1 m in latitude
+
+
+def town(seed=1, streets=150, houses=3000):
+    rnd = random.Random(seed)
+    lat0, lon0 = 49.97, 9.15
+
+    def point(x, y):
+        return [lat0 + y * DEG, lon0 + x * DEG * 1.55]
+
+    paths = {}
+    for i in range(streets):
+        x, y = rnd.uniform(0, 2000), rnd.uniform(0, 2000)
+        lines = []
+        for _ in range(rnd.randint(1, 3)):
+            line = [point(x, y)]
+            for _ in range(rnd.randint(1, 5)):
+                x, y = x + rnd.uniform(-150, 150), y + rnd.uniform(-150, 150)
+                line.append(point(x, y))
+            lines.append(line)
+        paths[f"s{i}"] = lines
+    # Some houses exactly on a street corner, where several segments tie
+    points = [tuple(line[0]) for lines in list(paths.values())[:20] for line in lines]
+    points += [tuple(point(rnd.uniform(-200, 2200), rnd.uniform(-200, 2200))) for _ in range(houses)]
+    return paths, points
+
+
+@pytest.mark.parametrize('radius', [None, 20, 45, 100])
+def test_engines_agree(radius):
+    paths, points = town()
+    python = nearest_streets(paths, points, radius, engine='python')
+    numpy = nearest_streets(paths, points, radius, engine='numpy')
+    assert numpy == python
+    if radius is not None:
+        assert any(s is None for s, _ in python)
+        assert all(d is None or d <= radius for _, d in python)
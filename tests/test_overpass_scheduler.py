@@ -0,0 +1,158 @@
+"""admin_modules/overpass_scheduler.py against local stub servers that answer
+like a busy Overpass instance (429 with Retry-After, 503, 'runtime error'
+remarks)."""
+
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from admin_modules.overpass import update_cache
+from admin_modules.overpass_scheduler import OverpassScheduler
+from admin_modules.raw_cache import KINDS, RawCache
+from admin_modules.stream_json import ElementStream
+
+QUERY = '[out:json];area["postal_code"="63834"]->.a; way["highway"](area.a); out geom;'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        srv = self.server
+        query = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())['data'][0]
+        with srv.lock:
+            srv.count += 1
+            n = srv.count
+            srv.active += 1
+            srv.max_active = max(srv.max_active, srv.active)
+        try:
+            time.sleep(srv.latency)
+            if srv.mode == 'down':
+                self.send_response(503)
+                self.end_headers()
+                return
+            if srv.mode == 'limited' and n <= 2:
+                self.send_response(429)
+                self.send_header('Retry-After', '7')
+                self.end_headers()
+                return
+            if srv.mode == 'timeout' and n == 1:
+                out = {'elements': [], 'remark': 'runtime error: Query timed out in "query" at line 1'}
+            else:
+                plz = query.split('"postal_code"="')[1][:5] if 'postal_code' in query else '00000'
+                kind = 'way' if 'highway' in query else 'node'
+                # One element shared by all PLZ (like a way on the border), one per PLZ
+                out = {'elements': [{'type': kind, 'id': 1}, {'type': kind, 'id': int(plz)}]}
+            body = json.dumps(out).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with srv.lock:
+                srv.active -= 1
+
+
+@pytest.fixture
+def serve():
+    """serve(mode, latency) -> (server, url); the servers stop after the test."""
+    servers = []
+
+    def start(mode, latency=0.0):
+        srv = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        srv.mode, srv.latency = mode, latency
+        srv.lock, srv.count, srv.active, srv.max_active = threading.Lock(), 0, 0, 0
+        threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(srv)
+        return srv, f"http://127.0.0.1:{srv.server_address[1]}/api/interpreter"
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+class Sleeps(list):
+    """Records the waits instead of sleeping."""
+
+    def __call__(self, seconds):
+        self.append(seconds)
+
+
+def test_slot_limit(serve, tmp_path):
+    srv, url = serve('ok', latency=0.1)
+    sched = OverpassScheduler([url], slots=2, backoff=0.01, sleep=Sleeps())
+    cache = RawCache(str(tmp_path), ttl_days=0, max_mb=0)
+    plz_liste = ['63834', '63843', '63839']
+    pairs = [(plz, kind) for plz in plz_liste for kind in KINDS]
+
+    assert update_cache(pairs, cache, sched) == set(pairs)
+    assert sched.requests == len(pairs)
+    assert srv.max_active == 2
+    # The way on the border is kept once
+    streets = ElementStream([partial(cache.elements, plz, 'streets') for plz in plz_liste])
+    assert sorted(el['id'] for el in streets) == [1, 63834, 63839, 63843]
+
+
+def test_retry_after(serve):
+    srv, url = serve('limited')
+    sleeps = Sleeps()
+    sched = OverpassScheduler([url], slots=1, backoff=0.01, sleep=sleeps)
+
+    assert sched.fetch(QUERY) is not None
+    assert sched.failures == 2
+    assert srv.count == 3
+    # Waits follow Retry-After, not the (short) backoff
+    assert len(sleeps) == 2
+    assert all(6 < s <= 7 for s in sleeps)
+
+
+def test_mirror_rotation(serve):
+    down, down_url = serve('down')
+    good, good_url = serve('ok')
+    sleeps = Sleeps()
+    sched = OverpassScheduler([down_url, good_url], slots=1, backoff=30, sleep=sleeps)
+
+    assert sched.fetch(QUERY) is not None
+    assert down.count == 1
+    assert good.count == 1
+    # The retry went to the other mirror right away
+    assert sleeps == []
+
+    # The busy mirror is skipped while it backs off
+    assert sched.fetch(QUERY) is not None
+    assert down.count == 1
+    assert good.count == 2
+
+
+@pytest.mark.parametrize('download', [False, True])
+def test_runtime_error_retry(serve, tmp_path, download):
+    srv, url = serve('timeout')
+    sched = OverpassScheduler([url], slots=1, backoff=0.01, sleep=Sleeps())
+    path = str(tmp_path / 'answer.json') if download else None
+
+    res = sched.fetch(QUERY, path)
+    assert sched.failures == 1
+    assert srv.count == 2
+    if download:
+        assert res == path
+        with open(path, 'r', encoding='utf-8') as f:
+            res = json.load(f)
+    assert 'remark' not in res
+    assert [el['id'] for el in res['elements']] == [1, 63834]
+
+
+def test_gives_up(serve, tmp_path):
+    srv, url = serve('down')
+    sched = OverpassScheduler([url], slots=1, attempts=3, backoff=0.01, sleep=Sleeps())
+    path = tmp_path / 'answer.json'
+
+    assert sched.fetch(QUERY, str(path)) is None
+    assert srv.count == 3
+    assert not path.exists()
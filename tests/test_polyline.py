@@ -0,0 +1,118 @@
+"""Round trip of the polyline6 plan format (admin_modules/polyline.py and the
+browser decoder in templates/index.html) against the plan structure."""
+
+import copy
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from admin_modules.polyline import (
+    decode_houses, decode_line, decode_plan, encode_houses, encode_line, encode_plan, is_compact
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_FILE = os.path.join(ROOT, 'data', 'streets_status.json')
+TEMPLATE = os.path.join(ROOT, 'templates', 'index.html')
+
+STREET = {
+    "name": "Teststraße",
+    "households": 12,
+    "length": 250,
+    "coords": [49.9, 9.15],
+    "path": [
+        [[49.9123456, 9.1512345], [49.9125, 9.152], [49.913, 9.1531]],
+        [],
+        [[-33.8688197, 151.2092955], [-33.87, 151.21]],
+        [[51.4778, -0.0014], [51.478, -0.0015]],
+    ],
+    "path_lod": {"14": [[[49.9123456, 9.1512345], [49.913, 9.1531]], []]},
+    "houses": [
+        {"lat": 49.91231, "lon": 9.15122, "w": 1},
+        {"lat": -12.5, "lon": -45.000001, "w": 6},
+    ],
+    "status": "taken",
+    "user": "Max M.",
+}
+
+
+def points_equal(a, b):
+    return len(a) == len(b) and all(round(p[0] * 1e6) == round(q[0] * 1e6) and round(p[1] * 1e6) == round(q[1] * 1e6)
+                                    for p, q in zip(a, b))
+
+
+def assert_street_equal(orig, decoded):
+    assert set(orig) == set(decoded)
+    assert len(orig['path']) == len(decoded['path'])
+    for a, b in zip(orig['path'], decoded['path']):
+        assert points_equal(a, b)
+    for z, lines in (orig.get('path_lod') or {}).items():
+        assert len(lines) == len(decoded['path_lod'][z])
+        for a, b in zip(lines, decoded['path_lod'][z]):
+            assert points_equal(a, b)
+    houses = orig.get('houses') or []
+    assert len(houses) == len(decoded['houses'])
+    for h, d in zip(houses, decoded['houses']):
+        assert points_equal([[h['lat'], h['lon']]], [[d['lat'], d['lon']]])
+        assert d['w'] == h.get('w', 1)
+    for k in orig:
+        if k not in ('path', 'path_lod', 'houses'):
+            assert decoded[k] == orig[k]
+
+
+def test_line_round_trip_negative_and_empty():
+    line = [[-33.8688197, 151.2092955], [-0.000001, -179.999999], [0.0, 0.0], [89.999999, 179.999999]]
+    assert points_equal(decode_line(encode_line(line)), line)
+    assert encode_line([]) == ''
+    assert decode_line('') == []
+
+
+def test_houses_round_trip():
+    houses = STREET['houses']
+    decoded = decode_houses(encode_houses(houses))
+    assert [h['w'] for h in decoded] == [1, 6]
+    assert decode_houses('') == []
+
+
+def test_plan_round_trip_synthetic():
+    plan = {"metadata": {"city": "Test"}, "streets": {"test": STREET, "empty": {"name": "Leer", "path": [], "houses": []}}}
+    encoded = encode_plan(copy.deepcopy(plan))
+    assert is_compact(encoded)
+    assert isinstance(encoded['streets']['test']['path'][0], str)
+    # Through JSON like the plan file on disk
+    decoded = decode_plan(json.loads(json.dumps(encoded)))
+    assert_street_equal(STREET, decoded['streets']['test'])
+    assert decoded['streets']['empty']['path'] == []
+    assert decoded['streets']['empty']['houses'] == []
+    assert decoded['metadata']['city'] == "Test"
+
+
+@pytest.mark.skipif(not os.path.exists(PLAN_FILE), reason="no plan file")
+def test_plan_round_trip_real_plan():
+    with open(PLAN_FILE, 'r', encoding='utf-8') as f:
+        plan = decode_plan(json.load(f))
+    assert plan['streets']
+    decoded = decode_plan(json.loads(json.dumps(encode_plan(copy.deepcopy(plan)))))
+    assert set(decoded['streets']) == set(plan['streets'])
+    for s_id, s in plan['streets'].items():
+        assert_street_equal(s, decoded['streets'][s_id])
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason="node not installed")
+def test_browser_decoder_matches():
+    with open(TEMPLATE, 'r', encoding='utf-8') as f:
+        html = f.read()
+    funcs = [re.search(r'function %s\(.*?\n        }\n' % name, html, re.S).group(0)
+             for name in ('decodeValues', 'decodePolyline', 'decodeHouses')]
+    lines = [encode_line(line) for line in STREET['path']]
+    houses = encode_houses(STREET['houses'])
+    script = '\n'.join(funcs) + (
+        f"\nconsole.log(JSON.stringify({{path: {json.dumps(lines)}.map(decodePolyline),"
+        f" houses: decodeHouses({json.dumps(houses)})}}));"
+    )
+    out = json.loads(subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout)
+    assert out['path'] == [decode_line(s) for s in lines]
+    assert out['houses'] == decode_houses(houses)
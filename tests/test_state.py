@@ -0,0 +1,73 @@
+"""Two state stores on the same files behave like two gunicorn workers."""
+
+import copy
+import json
+
+import pytest
+
+from app_modules.sqlite_store import SqliteStateStore
+from app_modules.state import JsonStateStore
+
+PLAN = {
+    "metadata": {"city": "Test"},
+    "streets": {
+        "a": {"name": "Astraße", "households": 3, "length": 100, "coords": [49.9, 9.1], "status": "free", "user": ""},
+        "b": {"name": "Bstraße", "households": 5, "length": 200, "coords": [49.8, 9.2], "status": "free", "user": ""},
+    },
+}
+
+
+@pytest.fixture
+def plan_file(tmp_path):
+    path = tmp_path / 'streets_status.json'
+    path.write_text(json.dumps(PLAN), encoding='utf-8')
+    return str(path)
+
+
+def json_pair(plan_file):
+    return JsonStateStore(plan_file, compact_interval=0), JsonStateStore(plan_file, compact_interval=0)
+
+
+def sqlite_pair(plan_file):
+    db = plan_file[:-5] + '.db'
+    return SqliteStateStore(plan_file, db, compact_interval=0), SqliteStateStore(plan_file, db, compact_interval=0)
+
+
+@pytest.mark.parametrize('copied', [False, True])
+def test_sqlite_save_keeps_concurrent_reservation(plan_file, copied):
+    a, b = sqlite_pair(plan_file)
+    data = a.get()
+    if copied:
+        data = copy.deepcopy(data)
+    b.append({"a": {"status": "taken", "user": "Max"}})
+
+    # Admin edit in worker A based on the state it read before the reservation
+    data['streets']['b']['name'] = "Bweg"
+    a.save(data)
+
+    for store in (a, b):
+        streets = store.get()['streets']
+        assert streets['a']['status'] == 'taken'
+        assert streets['a']['user'] == 'Max'
+        assert streets['b']['name'] == "Bweg"
+
+
+@pytest.mark.parametrize('copied', [False, True])
+@pytest.mark.parametrize('compacted', [False, True])
+def test_json_save_keeps_concurrent_reservation(plan_file, copied, compacted):
+    a, b = json_pair(plan_file)
+    data = a.get()
+    if copied:
+        data = copy.deepcopy(data)
+    b.append({"a": {"status": "taken", "user": "Max"}})
+    if compacted:
+        assert b.compact()
+
+    data['streets']['b']['name'] = "Bweg"
+    a.save(data)
+
+    for store in (a, b, JsonStateStore(plan_file, compact_interval=0)):
+        streets = store.get()['streets']
+        assert streets['a']['status'] == 'taken'
+        assert streets['a']['user'] == 'Max'
+        assert streets['b']['name'] == "Bweg"